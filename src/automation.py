@@ -1,11 +1,9 @@
 import os
-import re
-import time
 import logging
 from typing import Optional
 
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
-from .config import CONFIRM_BUTTON_SELECTOR, CONFIRM_TEXT_RE
+from .config import CLICK_TIMEOUT_MS, CONFIRM_BUTTON_SELECTOR, CONFIRM_TEXT_RE, NAV_TIMEOUT_MS
 
 
 def _default_browser_channel() -> Optional[str]:
@@ -34,93 +32,161 @@ def _default_user_data_dir(channel: Optional[str]) -> Optional[str]:
     return os.path.join(local, "Google", "Chrome", "User Data")
 
 
-def confirm_netflix_primary_location(
-    url: str,
-    close_delay_seconds: int = 10,
-    channel: Optional[str] = None,
-    user_data_dir: Optional[str] = None,
-    nav_timeout_ms: int = 30000,
-    click_timeout_ms: int = 30000,
-) -> bool:
-    """Ouvre l'URL Netflix, clique sur le bouton de confirmation et ferme après close_delay_seconds.
+class NetflixConfirmer:
+    """Garde un navigateur Playwright ouvert pour confirmer plusieurs URLs à la suite.
 
-    - Tente d'utiliser un profil persistant (Edge/Chrome) pour réutiliser la session Netflix.
-    - Boutons ciblés:
-      * [data-uia="set-primary-location-action"]
-      * Un bouton/lien contenant le texte "Confirmer la mise à jour" (insensible à la casse)
+    Le lancement du navigateur (le plus coûteux) n'a lieu qu'une fois dans __enter__;
+    chaque appel à confirm() n'ouvre et ne ferme qu'un onglet.
+
+        with NetflixConfirmer() as nc:
+            for url in urls:
+                nc.confirm(url)
     """
-    channel = channel or _default_browser_channel()
-    user_data_dir = user_data_dir or _default_user_data_dir(channel)
-    logging.info("Lancement Playwright: channel=%s | user_data_dir=%s | url=%s", channel, user_data_dir, url)
 
-    with sync_playwright() as p:
-        # Sélectionner le moteur chromium
-        browser_type = p.chromium
-        launch_kwargs = {}
+    def __init__(
+        self,
+        close_delay_seconds: int = 10,
+        channel: Optional[str] = None,
+        user_data_dir: Optional[str] = None,
+        nav_timeout_ms: int = NAV_TIMEOUT_MS,
+        click_timeout_ms: int = CLICK_TIMEOUT_MS,
+    ) -> None:
+        self.close_delay_seconds = close_delay_seconds
+        self.channel = channel or _default_browser_channel()
+        self.user_data_dir = user_data_dir or _default_user_data_dir(self.channel)
+        self.nav_timeout_ms = nav_timeout_ms
+        self.click_timeout_ms = click_timeout_ms
+        self._playwright = None
+        self._context = None
+
+    def __enter__(self) -> "NetflixConfirmer":
+        logging.info("Lancement Playwright: channel=%s | user_data_dir=%s", self.channel, self.user_data_dir)
+        self._playwright = sync_playwright().start()
+        try:
+            # Sélectionner le moteur chromium
+            browser_type = self._playwright.chromium
+            launch_kwargs = {}
 
-        # Utiliser un channel (msedge/chrome) si disponible
-        if channel:
-            launch_kwargs["channel"] = channel
+            # Utiliser un channel (msedge/chrome) si disponible
+            if self.channel:
+                launch_kwargs["channel"] = self.channel
 
-        context = None
-        try:
-            if user_data_dir:
+            if self.user_data_dir:
                 # Contexte persistant -> réutilise le profil existant (cookies)
-                logging.info("Ouverture d'un contexte persistant avec user_data_dir=%s", user_data_dir)
-                context = browser_type.launch_persistent_context(
-                    user_data_dir=user_data_dir,
+                logging.info("Ouverture d'un contexte persistant avec user_data_dir=%s", self.user_data_dir)
+                self._context = browser_type.launch_persistent_context(
+                    user_data_dir=self.user_data_dir,
                     **launch_kwargs,
                 )
             else:
                 # Contexte non persistant (peut nécessiter une reconnexion Netflix)
                 logging.info("Ouverture d'un navigateur non persistant")
                 browser = browser_type.launch(**launch_kwargs)
-                context = browser.new_context()
+                self._context = browser.new_context()
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        return self
 
-            page = context.new_page()
-            page.set_default_timeout(nav_timeout_ms)
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if self._context:
+                logging.info("Fermeture du contexte navigateur")
+                self._context.close()
+        except Exception:
+            pass
+        finally:
+            self._context = None
+            if self._playwright:
+                try:
+                    self._playwright.stop()
+                except Exception:
+                    pass
+                self._playwright = None
+
+    def _wait_after_click(self, clicked) -> bool:
+        """Attend que le bouton cliqué disparaisse (navigation ou page de succès).
+
+        close_delay_seconds sert de délai maximal. Retourne False si le bouton est toujours affiché,
+        la confirmation n'étant alors pas vérifiée.
+        """
+        timeout_ms = max(0, self.close_delay_seconds) * 1000
+        if not timeout_ms:
+            return True
+        logging.info("Attente de la prise en compte du clic (max %ss)…", self.close_delay_seconds)
+        try:
+            clicked.wait_for(state="hidden", timeout=timeout_ms)
+        except PlaywrightTimeoutError:
+            logging.warning(
+                "Bouton de confirmation toujours affiché après %ss: confirmation non vérifiée.",
+                self.close_delay_seconds,
+            )
+            return False
+        logging.info("Clic pris en compte (bouton de confirmation disparu)")
+        return True
+
+    def confirm(self, url: str) -> bool:
+        """Ouvre l'URL dans un nouvel onglet, clique sur le bouton de confirmation puis ferme l'onglet."""
+        if self._context is None:
+            raise RuntimeError("NetflixConfirmer doit être utilisé dans un bloc 'with'.")
+        logging.info("Ouverture de l'URL Netflix: %s", url)
+        page = self._context.new_page()
+        try:
+            page.set_default_timeout(self.nav_timeout_ms)
             logging.info("Navigation vers l'URL Netflix…")
             page.goto(url, wait_until="load")
 
-            # Chercher le bouton par sélecteur configurable (data-uia)
-            btn = page.locator(CONFIRM_BUTTON_SELECTOR)
+            # Un seul locator combinant sélecteur data-uia et texte (bouton ou lien):
+            # le premier visible l'emporte, en un seul délai d'attente au lieu de trois.
+            candidates = (
+                page.locator(CONFIRM_BUTTON_SELECTOR)
+                .or_(page.get_by_role("button", name=CONFIRM_TEXT_RE))
+                .or_(page.get_by_role("link", name=CONFIRM_TEXT_RE))
+            ).first
             found = False
             try:
-                btn.wait_for(state="visible", timeout=click_timeout_ms)
-                btn.click()
+                candidates.wait_for(state="visible", timeout=self.click_timeout_ms)
+                candidates.click()
                 found = True
-                logging.info("Bouton [data-uia='set-primary-location-action'] cliqué")
+                logging.info("Bouton de confirmation cliqué")
             except PlaywrightTimeoutError:
                 pass
 
-            if not found:
-                # Chercher par texte
-                # Essayer rôle bouton puis lien
-                re_txt = CONFIRM_TEXT_RE
-                try:
-                    page.get_by_role("button", name=re_txt).first.click(timeout=click_timeout_ms)
-                    found = True
-                    logging.info("Bouton par texte cliqué (role=button)")
-                except PlaywrightTimeoutError:
-                    try:
-                        page.get_by_role("link", name=re_txt).first.click(timeout=click_timeout_ms)
-                        found = True
-                        logging.info("Lien par texte cliqué (role=link)")
-                    except PlaywrightTimeoutError:
-                        pass
-
             if not found:
                 logging.info("Bouton de confirmation introuvable dans le délai imparti; la page reste ouverte.")
                 return False
 
-            # Laisser l'action se compléter puis fermer
-            logging.info("Attente de %ss avant fermeture…", max(0, close_delay_seconds))
-            time.sleep(max(0, close_delay_seconds))
-            return True
+            # Ne fermer l'onglet qu'une fois le clic suivi d'effet, close_delay_seconds n'est qu'un plafond
+            return self._wait_after_click(candidates)
         finally:
             try:
-                if context:
-                    logging.info("Fermeture du contexte navigateur")
-                    context.close()
+                page.close()
             except Exception:
                 pass
+
+
+def confirm_netflix_primary_location(
+    url: str,
+    close_delay_seconds: int = 10,
+    channel: Optional[str] = None,
+    user_data_dir: Optional[str] = None,
+    nav_timeout_ms: int = NAV_TIMEOUT_MS,
+    click_timeout_ms: int = CLICK_TIMEOUT_MS,
+) -> bool:
+    """Ouvre l'URL Netflix, clique sur le bouton de confirmation et ferme après close_delay_seconds.
+
+    - Tente d'utiliser un profil persistant (Edge/Chrome) pour réutiliser la session Netflix.
+    - Boutons ciblés:
+      * [data-uia="set-primary-location-action"]
+      * Un bouton/lien contenant le texte "Confirmer la mise à jour" (insensible à la casse)
+
+    Raccourci pour une confirmation isolée; utiliser NetflixConfirmer pour en enchaîner plusieurs.
+    """
+    with NetflixConfirmer(
+        close_delay_seconds=close_delay_seconds,
+        channel=channel,
+        user_data_dir=user_data_dir,
+        nav_timeout_ms=nav_timeout_ms,
+        click_timeout_ms=click_timeout_ms,
+    ) as nc:
+        return nc.confirm(url)
@@ -27,6 +27,18 @@ CONFIRM_TEXT_REGEX: str = os.getenv(
 )
 CONFIRM_TEXT_RE = re.compile(CONFIRM_TEXT_REGEX, re.I)
 
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Délais Playwright (ms): chargement de la page et apparition du bouton de confirmation
+NAV_TIMEOUT_MS: int = _env_int("NAV_TIMEOUT_MS", 15000)
+CLICK_TIMEOUT_MS: int = _env_int("CLICK_TIMEOUT_MS", 5000)
+
 # Requête Gmail par défaut (modulable via GMAIL_QUERY_DEFAULT)
 DEFAULT_GMAIL_QUERY: str = os.getenv(
     "GMAIL_QUERY_DEFAULT",
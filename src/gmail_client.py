@@ -1,17 +1,25 @@
 import base64
+import datetime
+import functools
+import html as html_lib
 import os
+import re
 import sys
+import threading
 import logging
-from typing import List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
-from bs4 import BeautifulSoup
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    etree = lxml_html = None  # type: ignore
 from .config import DEFAULT_GMAIL_QUERY, LINK_SUBSTRINGS
-from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+# Imports lourds (bs4, google_auth_oauthlib, googleapiclient.discovery, transport requests)
+# faits à la première utilisation: le chemin courant (token en cache) ne les paie pas tous.
+
 # Scopes pour lire et modifier (marquer comme lu)
 SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
 
@@ -22,6 +30,89 @@ os.environ.setdefault("OAUTHLIB_RELAX_TOKEN_SCOPE", "1")
 
 DEFAULT_QUERY = DEFAULT_GMAIL_QUERY
 
+# Masques "fields" partiels: seuls les en-têtes et corps des parties MIME sont renvoyés,
+# ce qui réduit fortement la taille de la réponse par rapport à format="full" brut.
+def _parts_mask(depth: int) -> str:
+    node = "mimeType,body(data,attachmentId)"
+    if depth > 0:
+        node += f",parts({_parts_mask(depth - 1)})"
+    return node
+
+
+MESSAGE_FIELDS = f"id,internalDate,payload(headers,{_parts_mask(3)})"
+
+# URLs dans les parties texte brut
+_URL_RE = re.compile(r"https?://\S+")
+# Ponctuation parasite en fin d'URL (texte brut)
+_TRAILING_PUNCT = ").,>]')\""
+
+_REQUESTER_XPATH = (
+    "//td[contains(translate(normalize-space(.), "
+    "'ABCDEFGHIJKLMNOPQRSTUVWXYZÉ', 'abcdefghijklmnopqrstuvwxyzé'), "
+    "'demande effectuée par')]"
+)
+
+# Préfixe du libellé 'Demande effectuée par' commun aux encodages de l'accent (é, &eacute;, &#233;)
+_REQUESTER_MARKER_B = b"demande effectu"
+
+# Nombre maximal de requêtes par BatchHttpRequest accepté par l'API Gmail
+_BATCH_MAX = 100
+
+_LINK_SUBSTRINGS_B = [s.encode("utf-8") for s in LINK_SUBSTRINGS]
+
+# Pré-filtre sur les octets bruts du HTML: évite de construire le DOM dans le cas courant
+_HREF_RE = re.compile(
+    rb"""href\s*=\s*["']([^"']*(?:"""
+    + b"|".join(re.escape(s) for s in _LINK_SUBSTRINGS_B)
+    + rb""")[^"']*)["']""",
+    re.I,
+)
+
+# Cellule 'Demande effectuée par' sans balise imbriquée (gabarit Netflix): lue sans construire de DOM
+_REQUESTER_RE = re.compile(
+    rb"<td[^>]*>([^<]*demande\s+effectu(?:\xc3\xa9|&eacute;|&#233;|e)e\s+par[^<]*)</td>",
+    re.I,
+)
+_WS_RE = re.compile(r"\s+")
+
+# Parseur lxml pour les corps HTML en octets: UTF-8 comme le décodage des autres chemins,
+# au lieu de l'ISO-8859-1 par défaut de libxml2 en l'absence de <meta charset>
+_LXML_UTF8_PARSER = lxml_html.HTMLParser(encoding='utf-8') if lxml_html is not None else None
+
+
+def _make_soup(html: str):
+    """Construit un BeautifulSoup avec lxml (parseur C), ou html.parser si lxml est absent."""
+    from bs4 import BeautifulSoup, FeatureNotFound
+    try:
+        return BeautifulSoup(html, 'lxml')
+    except FeatureNotFound:
+        return BeautifulSoup(html, 'html.parser')
+
+
+def _find_requester_cell(html: bytes) -> Optional[str]:
+    """Retourne le texte de la première cellule <td> contenant 'Demande effectuée par'.
+
+    Reçoit les octets bruts: lxml refuse une chaîne str précédée d'un prologue
+    <?xml ... encoding="..."?>, fréquent dans les corps HTML des e-mails.
+    """
+    if lxml_html is not None:
+        try:
+            tree = lxml_html.fromstring(html, parser=_LXML_UTF8_PARSER)
+        except (ValueError, etree.ParserError):
+            return None
+        # Recherche en une passe XPath (côté C) plutôt qu'une boucle Python sur chaque <td>
+        for td in tree.xpath(_REQUESTER_XPATH):
+            txt = " ".join(t.strip() for t in td.itertext() if t.strip())
+            if txt:
+                return txt
+        return None
+    soup = _make_soup(html.decode('utf-8', errors='ignore'))
+    for td in soup.find_all('td'):
+        txt = td.get_text(separator=' ', strip=True)
+        if txt and 'demande effectuée par' in txt.lower():
+            return txt
+    return None
+
 
 def _resolve_credentials_path(preferred_path: Optional[str]) -> str:
     """Trouve un chemin valide pour credentials.json en contexte normal ou PyInstaller.
@@ -33,21 +124,45 @@ def _resolve_credentials_path(preferred_path: Optional[str]) -> str:
     - répertoire de l'exécutable (si frozen)
     - dossier temporaire de PyInstaller (sys._MEIPASS) si présent
     - répertoire du module (src) et son parent
+
+    Le résultat est mis en cache par combinaison (CREDENTIALS_PATH, chemin, cwd, frozen, _MEIPASS).
     """
-    env_path = os.getenv("CREDENTIALS_PATH")
+    found = _resolve_credentials_path_cached(
+        os.getenv("CREDENTIALS_PATH"),
+        preferred_path,
+        os.getcwd(),
+        bool(getattr(sys, "frozen", False)),
+        getattr(sys, "_MEIPASS", None),
+    )
+    if found is None:
+        # Ne pas mémoriser l'absence: le fichier peut être ajouté avant le prochain appel
+        _resolve_credentials_path_cached.cache_clear()
+        # Retourne le préféré ou le nom par défaut (pour l'erreur explicite plus loin)
+        return preferred_path or "credentials.json"
+    return found
+
+
+@functools.lru_cache(maxsize=8)
+def _resolve_credentials_path_cached(
+    env_path: Optional[str],
+    preferred_path: Optional[str],
+    cwd: str,
+    frozen: bool,
+    meipass: Optional[str],
+) -> Optional[str]:
     candidates: List[str] = []
     if env_path:
         candidates.append(env_path)
     if preferred_path:
-        candidates.append(os.path.abspath(preferred_path))
+        candidates.append(os.path.join(cwd, preferred_path))
     # cwd
-    candidates.append(os.path.join(os.getcwd(), "credentials.json"))
+    candidates.append(os.path.join(cwd, "credentials.json"))
     # executable dir (frozen)
-    if getattr(sys, "frozen", False):
+    if frozen:
         exe_dir = os.path.dirname(sys.executable)
         candidates.append(os.path.join(exe_dir, "credentials.json"))
-        if hasattr(sys, "_MEIPASS"):
-            candidates.append(os.path.join(getattr(sys, "_MEIPASS"), "credentials.json"))
+        if meipass:
+            candidates.append(os.path.join(meipass, "credentials.json"))
     # module dir
     mod_dir = os.path.dirname(os.path.abspath(__file__))
     candidates.append(os.path.join(mod_dir, "credentials.json"))
@@ -59,22 +174,85 @@ def _resolve_credentials_path(preferred_path: Optional[str]) -> str:
                 return p
         except Exception:
             continue
-    # Retourne le préféré ou le nom par défaut (pour l'erreur explicite plus loin)
-    return preferred_path or "credentials.json"
+    return None
+
+
+def _get_oauth_port() -> int:
+    # Port par défaut (CLI); la GUI passe le sien explicitement via GmailWatcher.oauth_port
+    return _parse_oauth_port(os.getenv("OAUTH_LOCAL_SERVER_PORT", "6969"))
+
+
+@functools.lru_cache(maxsize=1)
+def _parse_oauth_port(raw: str) -> int:
+    try:
+        return int(raw)
+    except ValueError:
+        return 6969
+
+
+def _headers(msg: dict) -> Dict[str, str]:
+    """En-têtes du message (noms en minuscules), calculés une fois puis mémorisés dans msg."""
+    d = msg.get('_headers_cache')
+    if d is None:
+        d = {h['name'].lower(): h['value'] for h in msg.get('payload', {}).get('headers', [])}
+        msg['_headers_cache'] = d
+    return d
+
+
+def _seconds_until_expiry(creds: Credentials) -> float:
+    # google-auth stocke expiry en UTC naïf
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return (creds.expiry - now).total_seconds()
+
+
+def _walk_leaf_parts(node: dict) -> Iterator[Tuple[str, dict]]:
+    """Parcourt récursivement le payload et produit (mimeType, body) pour chaque partie feuille."""
+    if not node:
+        return
+    if node.get('parts'):
+        # Multipart nested
+        for p in node['parts']:
+            yield from _walk_leaf_parts(p)
+        return
+    body = node.get('body', {})
+    if body:
+        yield node.get('mimeType', ''), body
 
 
 class GmailWatcher:
-    def __init__(self, credentials_path: str = "credentials.json", token_path: str = "token.json") -> None:
+    def __init__(
+        self,
+        credentials_path: str = "credentials.json",
+        token_path: str = "token.json",
+        oauth_port: Optional[int] = None,
+    ) -> None:
         self.credentials_path = _resolve_credentials_path(credentials_path)
         self.token_path = token_path
+        # Port du serveur local OAuth; None = OAUTH_LOCAL_SERVER_PORT (ou 6969)
+        self.oauth_port = oauth_port
         self.creds: Optional[Credentials] = None
+        # mtime de token.json lors du dernier chargement/écriture (évite de le reparser)
+        self._token_mtime: Optional[float] = None
         self.service = None
+        self._refresh_lock = threading.Lock()
         self._label_cache: dict = {}
+        # Dernier historyId Gmail vu, persisté à côté de token.json
+        self.history_path = os.path.join(os.path.dirname(os.path.abspath(token_path)), "history_id.txt")
 
     def _load_credentials(self) -> Credentials:
+        # Identifiants déjà chargés et encore valides: pas de relecture de token.json
+        if self.creds is not None and self.creds.valid:
+            return self.creds
         logging.info("Chargement des identifiants OAuth (token: %s, creds: %s)", self.token_path, self.credentials_path)
         creds = None
-        if os.path.exists(self.token_path):
+        try:
+            token_mtime: Optional[float] = os.stat(self.token_path).st_mtime
+        except OSError:
+            token_mtime = None
+        if token_mtime is not None and self.creds is not None and token_mtime == self._token_mtime:
+            # token.json inchangé depuis le dernier chargement: réutiliser l'objet déjà parsé
+            creds = self.creds
+        elif token_mtime is not None:
             logging.info("token.json trouvé, tentative de chargement…")
             try:
                 creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
@@ -92,97 +270,128 @@ class GmailWatcher:
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
                 logging.info("Token expiré, tentative de rafraîchissement…")
+                from google.auth.transport.requests import Request
                 try:
                     creds.refresh(Request())
                     logging.info("Rafraîchissement du token réussi.")
                 except Exception:
                     # Rafraîchissement impossible (token révoqué/expiré sans refresh valide) -> reconsentir
                     logging.warning("Rafraîchissement impossible, lancement du flux OAuth local pour reconsentir…")
-                    flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
-                    try:
-                        port = int(os.getenv("OAUTH_LOCAL_SERVER_PORT", "6969"))
-                    except ValueError:
-                        port = 6969
-                    try:
-                        logging.info("Ouverture du serveur local OAuth sur le port %s", port)
-                        # Forcer un refresh_token en mode offline + consent
-                        creds = flow.run_local_server(
-                            port=port,
-                            access_type="offline",
-                            prompt="consent",
-                        )
-                    except Exception as e:
-                        msg = str(e)
-                        if "redirect_uri_mismatch" in msg or "MismatchingRedirectURIError" in msg:
-                            raise RuntimeError(
-                                "redirect_uri_mismatch: Vos identifiants OAuth ne correspondent pas au flux utilisé. "
-                                "Créez un client OAuth de type 'Application de bureau' (recommandé) et remplacez credentials.json, "
-                                "ou utilisez un client 'Web' avec une redirection autorisée exacte (ex: http://localhost:8080/) "
-                                "et définissez OAUTH_LOCAL_SERVER_PORT=8080."
-                            ) from e
-                        raise
+                    creds = self._run_flow()
             else:
                 logging.info("Aucun token valide trouvé, lancement du flux OAuth local…")
                 # Recalcul défensif au cas où l'environnement change
                 self.credentials_path = _resolve_credentials_path(self.credentials_path)
                 logging.info("Utilisation du credentials.json: %s", self.credentials_path)
-                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
-                # Permet d'imposer un port fixe si vous utilisez un client OAuth de type "Web"
-                # avec une redirection autorisée spécifique (ex: http://localhost:8080/)
-                try:
-                    port = int(os.getenv("OAUTH_LOCAL_SERVER_PORT", "6969"))
-                except ValueError:
-                    port = 6969
-                try:
-                    logging.info("Ouverture du serveur local OAuth sur le port %s", port)
-                    # Forcer un refresh_token en mode offline + consent
-                    creds = flow.run_local_server(
-                        port=port,
-                        access_type="offline",
-                        prompt="consent",
-                    )
-                except Exception as e:
-                    msg = str(e)
-                    if "redirect_uri_mismatch" in msg or "MismatchingRedirectURIError" in msg:
-                        raise RuntimeError(
-                            "redirect_uri_mismatch: Vos identifiants OAuth ne correspondent pas au flux utilisé. "
-                            "Créez un client OAuth de type 'Application de bureau' (recommandé) et remplacez credentials.json, "
-                            "ou utilisez un client 'Web' avec une redirection autorisée exacte (ex: http://localhost:8080/) "
-                            "et définissez OAUTH_LOCAL_SERVER_PORT=8080."
-                        ) from e
-                    raise
+                creds = self._run_flow()
             # A ce stade on peut encore se retrouver sans refresh_token (comptes/clients particuliers)
             if creds and not getattr(creds, "refresh_token", None):
                 logging.warning(
                     "Les informations d'authentification ne contiennent pas de refresh_token. "
                     "Relance du flux OAuth avec 'prompt=consent' pour l'obtenir…"
                 )
-                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
-                try:
-                    port = int(os.getenv("OAUTH_LOCAL_SERVER_PORT", "6969"))
-                except ValueError:
-                    port = 6969
-                creds = flow.run_local_server(
-                    port=port,
-                    access_type="offline",
-                    prompt="consent",
-                )
+                creds = self._run_flow()
             with open(self.token_path, "w") as token:
                 token.write(creds.to_json())
             logging.info("token.json enregistré.")
+        self._remember_token_mtime()
         self.creds = creds
         return creds
 
+    def _run_flow(self) -> Credentials:
+        """Lance le flux OAuth local (offline + consent pour obtenir un refresh_token)."""
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
+        # Permet d'imposer un port fixe si vous utilisez un client OAuth de type "Web"
+        # avec une redirection autorisée spécifique (ex: http://localhost:8080/)
+        port = self.oauth_port if self.oauth_port is not None else _get_oauth_port()
+        try:
+            logging.info("Ouverture du serveur local OAuth sur le port %s", port)
+            return flow.run_local_server(
+                port=port,
+                access_type="offline",
+                prompt="consent",
+            )
+        except Exception as e:
+            msg = str(e)
+            if "redirect_uri_mismatch" in msg or "MismatchingRedirectURIError" in msg:
+                raise RuntimeError(
+                    "redirect_uri_mismatch: Vos identifiants OAuth ne correspondent pas au flux utilisé. "
+                    "Créez un client OAuth de type 'Application de bureau' (recommandé) et remplacez credentials.json, "
+                    "ou utilisez un client 'Web' avec une redirection autorisée exacte (ex: http://localhost:8080/) "
+                    "et définissez OAUTH_LOCAL_SERVER_PORT=8080."
+                ) from e
+            raise
+
     def _ensure_service(self):
         if self.service is None:
+            from googleapiclient.discovery import build
             creds = self._load_credentials()
-            self.service = build("gmail", "v1", credentials=creds, cache_discovery=False)
+            # Document de découverte embarqué dans google-api-python-client: aucun appel réseau
+            self.service = build("gmail", "v1", credentials=creds, cache_discovery=False, static_discovery=True)
             logging.info("Client Gmail initialisé.")
+        else:
+            self._refresh_if_expiring()
         return self.service
 
-    def search_messages(self, query: Optional[str] = None, max_results: int = 10) -> List[str]:
+    def _refresh_if_expiring(self, stale_seconds: int = 300, blocking_seconds: int = 60) -> None:
+        """Rafraîchit le token avant son expiration pour éviter un 401 en plein traitement.
+
+        Sous stale_seconds le rafraîchissement part dans un thread d'arrière-plan et le token
+        courant (encore valide) est utilisé; sous blocking_seconds il est fait immédiatement.
+        """
+        creds = self.creds
+        if not creds or not creds.expiry or not creds.refresh_token:
+            return
+        remaining = _seconds_until_expiry(creds)
+        if remaining >= stale_seconds:
+            return
+        if remaining < blocking_seconds:
+            with self._refresh_lock:
+                # Un rafraîchissement en arrière-plan a pu aboutir pendant l'attente du verrou
+                if _seconds_until_expiry(creds) >= blocking_seconds:
+                    return
+                self._refresh_creds(creds, remaining)
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # déjà en cours
+
+        def worker():
+            try:
+                self._refresh_creds(creds, remaining)
+            finally:
+                self._refresh_lock.release()
+
+        threading.Thread(target=worker, name="gmail-token-refresh", daemon=True).start()
+
+    def _refresh_creds(self, creds: Credentials, remaining: float) -> None:
+        logging.info("Token expirant dans %ss, rafraîchissement anticipé…", int(remaining))
+        from google.auth.transport.requests import Request
+        try:
+            creds.refresh(Request())
+            with open(self.token_path, "w") as token:
+                token.write(creds.to_json())
+            self._remember_token_mtime()
+        except Exception as e:
+            logging.warning("Rafraîchissement anticipé impossible: %s", e)
+
+    def _remember_token_mtime(self) -> None:
+        try:
+            self._token_mtime = os.stat(self.token_path).st_mtime
+        except OSError:
+            self._token_mtime = None
+
+    def search_messages(
+        self,
+        query: Optional[str] = None,
+        max_results: int = 10,
+        anchor_ts_ms: Optional[int] = None,
+    ) -> List[str]:
         service = self._ensure_service()
         q = query or os.getenv("GMAIL_QUERY") or DEFAULT_QUERY
+        if anchor_ts_ms is not None:
+            # Filtrage côté serveur: seuls les messages reçus après l'ancre (secondes epoch)
+            q = f"{q} after:{anchor_ts_ms // 1000}"
         try:
             logging.info("Recherche des messages dans INBOX avec la requête: %s (max_results=%s)", q, max_results)
             results = service.users().messages().list(
@@ -198,21 +407,144 @@ class GmailWatcher:
         except HttpError as e:
             raise RuntimeError(f"Erreur lors de la recherche Gmail: {e}")
 
-    def get_message_raw(self, message_id: str) -> dict:
+    def search_messages_incremental(self, start_history_id: str) -> Tuple[List[str], str]:
+        """Liste les messages ajoutés à INBOX depuis start_history_id (users.history.list).
+
+        Retourne (ids, dernier historyId). Lève HttpError (404) si start_history_id est trop ancien.
+        """
         service = self._ensure_service()
+        ids: List[str] = []
+        latest = start_history_id
+        page_token: Optional[str] = None
+        while True:
+            resp = service.users().history().list(
+                userId="me",
+                startHistoryId=start_history_id,
+                historyTypes=["messageAdded"],
+                labelId="INBOX",
+                pageToken=page_token,
+            ).execute()
+            for h in resp.get("history", []):
+                for added in h.get("messagesAdded", []):
+                    mid = added.get("message", {}).get("id")
+                    if mid and mid not in ids:
+                        ids.append(mid)
+            latest = resp.get("historyId", latest)
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+        logging.info("%s message(s) ajouté(s) à INBOX depuis historyId=%s (nouvel historyId=%s)", len(ids), start_history_id, latest)
+        return ids, latest
+
+    def search_new_messages(
+        self,
+        query: Optional[str] = None,
+        max_results: int = 10,
+        anchor_ts_ms: Optional[int] = None,
+    ) -> Tuple[List[str], Optional[str]]:
+        """Comme search_messages, mais n'interroge l'index Gmail que si INBOX a changé.
+
+        Un appel history.list (peu coûteux) détermine si des messages sont arrivés depuis le
+        dernier historyId persisté; sinon la recherche complète est évitée. La recherche par
+        requête reste la source de vérité (filtre expéditeur / non lu).
+
+        Retourne (ids, historyId courant). L'historyId n'est pas persisté ici: l'appelant le passe
+        à save_history_id une fois les candidats traités, sans quoi un message non récupéré
+        serait masqué aux cycles suivants.
+        """
+        start = self._read_history_id()
+        latest: Optional[str] = None
+        if start:
+            try:
+                added, latest = self.search_messages_incremental(start)
+            except HttpError as e:
+                if getattr(e, "resp", None) is None or e.resp.status != 404:
+                    raise RuntimeError(f"Erreur lors de la lecture de l'historique Gmail: {e}")
+                logging.info("historyId %s expiré, retour à la recherche complète.", start)
+                latest = None
+            else:
+                if not added:
+                    return [], latest
+        if latest is None:
+            # Premier passage (ou historique expiré): partir de l'historyId courant
+            try:
+                latest = self._ensure_service().users().getProfile(userId="me").execute().get("historyId")
+            except HttpError as e:
+                logging.warning("Impossible de lire l'historyId courant: %s", e)
+        ids = self.search_messages(query=query, max_results=max_results, anchor_ts_ms=anchor_ts_ms)
+        return ids, latest
+
+    def _read_history_id(self) -> Optional[str]:
+        try:
+            with open(self.history_path, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def save_history_id(self, history_id: str) -> None:
+        """Persiste le curseur history.list retourné par search_new_messages."""
         try:
-            logging.info("Récupération du message id=%s", message_id)
-            msg = service.users().messages().get(userId="me", id=message_id, format="full").execute()
+            with open(self.history_path, "w", encoding="utf-8") as f:
+                f.write(str(history_id))
+        except OSError as e:
+            logging.warning("Impossible d'enregistrer l'historyId: %s", e)
+
+    def _execute_batch(self, requests: Dict[str, object], what: str) -> Dict[str, dict]:
+        """Exécute des requêtes Gmail par lots (BatchHttpRequest) et retourne les réponses par clé.
+
+        Les requêtes en erreur sont journalisées et absentes du résultat.
+        """
+        service = self._ensure_service()
+        results: Dict[str, dict] = {}
+
+        def callback(request_id: str, response: dict, exception: Optional[Exception]) -> None:
+            if exception is not None:
+                logging.warning("Erreur Gmail (%s) pour id=%s: %s", what, request_id, exception)
+                return
+            results[request_id] = response
+
+        keys = list(requests)
+        for start in range(0, len(keys), _BATCH_MAX):
+            batch = service.new_batch_http_request(callback=callback)
+            for key in keys[start:start + _BATCH_MAX]:
+                batch.add(requests[key], request_id=key)
             try:
-                headers = {h['name'].lower(): h['value'] for h in msg.get('payload', {}).get('headers', [])}
-                subject = headers.get('subject', '(sans sujet)')
-                sender = headers.get('from', '(inconnu)')
-                logging.info("Message récupéré: subject=%s | from=%s | id=%s", subject, sender, message_id)
-            except Exception:
-                pass
-            return msg
-        except HttpError as e:
-            raise RuntimeError(f"Erreur lors de la récupération du message {message_id}: {e}")
+                batch.execute()
+            except HttpError as e:
+                raise RuntimeError(f"Erreur lors de l'exécution du lot Gmail ({what}): {e}")
+        return results
+
+    def get_messages_raw(self, message_ids: List[str], fields: Optional[str] = MESSAGE_FIELDS) -> Dict[str, dict]:
+        """Récupère plusieurs messages en une seule requête HTTP par lot de 100."""
+        if not message_ids:
+            return {}
+        service = self._ensure_service()
+        logging.info("Récupération groupée de %s message(s)", len(message_ids))
+        requests = {
+            mid: service.users().messages().get(userId="me", id=mid, format="full", fields=fields)
+            for mid in message_ids
+        }
+        return self._execute_batch(requests, "récupération")
+
+    def _get_attachments(self, message_id: str, attachment_ids: List[str]) -> Dict[str, bytes]:
+        """Récupère et décode plusieurs pièces jointes d'un message en un seul lot."""
+        if not attachment_ids:
+            return {}
+        service = self._ensure_service()
+        requests = {
+            att_id: service.users().messages().attachments().get(userId="me", messageId=message_id, id=att_id)
+            for att_id in attachment_ids
+        }
+        try:
+            fetched = self._execute_batch(requests, "pièce jointe")
+        except RuntimeError as e:
+            logging.warning("Pièces jointes du message id=%s non récupérées: %s", message_id, e)
+            return {}
+        return {
+            att_id: base64.urlsafe_b64decode(att['data'])
+            for att_id, att in fetched.items()
+            if att.get('data')
+        }
 
     def mark_as_read(self, message_id: str) -> None:
         service = self._ensure_service()
@@ -226,6 +558,28 @@ class GmailWatcher:
         except HttpError as e:
             raise RuntimeError(f"Erreur lors du marquage en lu du message {message_id}: {e}")
 
+    def start_push_watch(self, topic_name: str, label_ids: Optional[List[str]] = None) -> dict:
+        """Abonne la boîte aux notifications Gmail (users.watch) publiées sur un topic Pub/Sub.
+
+        Gmail exige un renouvellement au moins tous les 7 jours. Retourne {historyId, expiration}.
+        """
+        service = self._ensure_service()
+        body = {"topicName": topic_name, "labelIds": label_ids or ["INBOX"]}
+        try:
+            resp = service.users().watch(userId="me", body=body).execute()
+            logging.info("Notifications Gmail actives sur %s (historyId=%s, expiration=%s)", topic_name, resp.get("historyId"), resp.get("expiration"))
+            return resp
+        except HttpError as e:
+            raise RuntimeError(f"Erreur lors de l'abonnement aux notifications Gmail ({topic_name}): {e}")
+
+    def stop_push_watch(self) -> None:
+        service = self._ensure_service()
+        try:
+            service.users().stop(userId="me").execute()
+            logging.info("Notifications Gmail désactivées.")
+        except HttpError as e:
+            raise RuntimeError(f"Erreur lors de l'arrêt des notifications Gmail: {e}")
+
     def trash_message(self, message_id: str) -> None:
         """Déplace le message dans la corbeille (supprime non définitive)."""
         service = self._ensure_service()
@@ -265,11 +619,20 @@ class GmailWatcher:
         except HttpError as e:
             raise RuntimeError(f"Erreur lors de la création du libellé '{label_name}': {e}")
 
-    def move_message_to_label(self, message_id: str, label_name: str, remove_from_inbox: bool = True) -> None:
-        """Ajoute le libellé au message et retire 'INBOX' pour simuler un déplacement."""
+    def move_message_to_label(
+        self,
+        message_id: str,
+        label_name: str,
+        remove_from_inbox: bool = True,
+        mark_read: bool = False,
+    ) -> None:
+        """Ajoute le libellé au message et retire 'INBOX' pour simuler un déplacement.
+
+        Avec mark_read=True, le message est aussi marqué comme lu dans le même appel modify.
+        """
         service = self._ensure_service()
         label_id = self._get_or_create_label_id(label_name)
-        remove_ids = ["UNREAD"] if False else []  # on préserve l'état lu/non lu par défaut
+        remove_ids = ["UNREAD"] if mark_read else []  # on préserve l'état lu/non lu par défaut
         if remove_from_inbox:
             remove_ids.append("INBOX")
         body = {
@@ -279,77 +642,61 @@ class GmailWatcher:
         try:
             service.users().messages().modify(userId="me", id=message_id, body=body).execute()
             logging.info(
-                "Message id=%s déplacé vers le libellé '%s' (id=%s), remove_from_inbox=%s",
+                "Message id=%s déplacé vers le libellé '%s' (id=%s), remove_from_inbox=%s, mark_read=%s",
                 message_id,
                 label_name,
                 label_id,
                 remove_from_inbox,
+                mark_read,
             )
         except HttpError as e:
             raise RuntimeError(f"Erreur lors du déplacement du message {message_id} vers '{label_name}': {e}")
 
-    def _gather_parts(self, payload: dict, message_id: Optional[str]) -> List[Tuple[str, bytes]]:
-        parts: List[Tuple[str, bytes]] = []
-        if not payload:
-            return parts
-        # Helper pour ajouter un part
-        def add_part(mime: str, body: dict):
+    def _iter_parts(
+        self,
+        payload: dict,
+        message_id: Optional[str],
+        wanted_mimes: Tuple[str, ...] = ('text/html', 'text/plain'),
+    ) -> Iterator[Tuple[str, Callable[[], bytes]]]:
+        """Parcourt les parties MIME voulues et produit (mimeType, fournisseur d'octets).
+
+        Le décodage base64 n'a lieu que si l'appelant invoque le fournisseur; il peut donc
+        s'arrêter au premier résultat. Les parties externalisées (attachmentId) sont toutes
+        récupérées en un seul lot, au premier fournisseur qui en a besoin.
+        Les autres parties (images, PDF…) ne sont ni décodées ni téléchargées.
+        """
+        leaves = [(mime, body) for mime, body in _walk_leaf_parts(payload) if mime.startswith(wanted_mimes)]
+        pending = [body['attachmentId'] for _, body in leaves if not body.get('data') and body.get('attachmentId')]
+        fetched: Optional[Dict[str, bytes]] = None
+
+        def get_attachment(attachment_id: str) -> bytes:
+            nonlocal fetched
+            if fetched is None:
+                fetched = self._get_attachments(message_id, pending)
+            return fetched.get(attachment_id, b"")
+
+        for mime, body in leaves:
             data = body.get('data')
             attachment_id = body.get('attachmentId')
             if data:
-                parts.append((mime, base64.urlsafe_b64decode(data)))
+                yield mime, functools.partial(base64.urlsafe_b64decode, data)
             elif attachment_id and message_id:
-                # Récupérer la pièce jointe (utile si HTML/texte est externalisé)
-                try:
-                    svc = self._ensure_service()
-                    att = svc.users().messages().attachments().get(userId="me", messageId=message_id, id=attachment_id).execute()
-                    a_data = att.get('data')
-                    if a_data:
-                        parts.append((mime, base64.urlsafe_b64decode(a_data)))
-                except HttpError:
-                    pass
-
-        if 'parts' in payload and payload['parts']:
-            for p in payload['parts']:
-                mime = p.get('mimeType', '')
-                body = p.get('body', {})
-                if body:
-                    add_part(mime, body)
-                # Multipart nested
-                parts.extend(self._gather_parts(p, message_id))
-        else:
-            mime = payload.get('mimeType', '')
-            body = payload.get('body', {})
-            if body:
-                add_part(mime, body)
-        try:
-            logging.info("Collecte des parties du message: %s partie(s) trouvée(s).", len(parts))
-        except Exception:
-            pass
-        return parts
-
-    def extract_update_link_from_message(self, msg: dict) -> Optional[str]:
-        payload = msg.get('payload', {})
-        message_id = msg.get('id')
-        parts = self._gather_parts(payload, message_id)
-        logging.info("Extraction du lien d'update: %s partie(s) collectée(s).", len(parts))
+                yield mime, functools.partial(get_attachment, attachment_id)
 
-        # Parcourir HTML d'abord, puis texte
-        html_candidates: List[str] = []
-        text_candidates: List[str] = []
-        for mime, content in parts:
-            try:
-                text = content.decode('utf-8', errors='ignore')
-            except Exception:
-                continue
-            if mime.startswith('text/html'):
-                html_candidates.append(text)
-            elif mime.startswith('text/plain'):
-                text_candidates.append(text)
+    def _find_link_fallback(
+        self,
+        html_candidates: List[str],
+        text_providers: List[Callable[[], bytes]],
+        message_id: Optional[str],
+    ) -> Optional[str]:
+        """Recherche du lien par BeautifulSoup puis dans le texte brut, quand la regex a échoué.
 
+        html_candidates: parties HTML décodées contenant un motif; text_providers: parties texte
+        brut, lues seulement si le HTML ne donne rien.
+        """
         # Chercher dans HTML
         for html in html_candidates:
-            soup = BeautifulSoup(html, 'html5lib')
+            soup = _make_soup(html)
             for a in soup.find_all('a', href=True):
                 href = a['href']
                 href_l = href.lower()
@@ -357,57 +704,92 @@ class GmailWatcher:
                     logging.info("Lien contenant motif %s trouvé dans HTML: %s", LINK_SUBSTRINGS, href)
                     return href
         # Fallback texte brut: capturer URLs
-        import re
-        url_re = re.compile(r"https?://\S+")
-        for txt in text_candidates:
-            for url in url_re.findall(txt):
+        for get_content in text_providers:
+            content = get_content()
+            # Test sur les octets: seule la partie qui contient un motif est décodée
+            content_l = content.lower()
+            if not any(substr in content_l for substr in _LINK_SUBSTRINGS_B):
+                continue
+            txt = content.decode('utf-8', errors='ignore')
+            for url in _URL_RE.findall(txt):
                 url_l = url.lower()
                 if any(substr in url_l for substr in LINK_SUBSTRINGS):
                     # Nettoyage basique si traînent des ponctuations
-                    url = url.rstrip(").,>]')\"")
+                    url = url.rstrip(_TRAILING_PUNCT)
                     logging.info("Lien contenant motif %s trouvé dans texte: %s", LINK_SUBSTRINGS, url)
                     return url
         logging.info("Aucun lien correspondant aux motifs %s trouvé dans le message id=%s", LINK_SUBSTRINGS, message_id)
         return None
 
-    @staticmethod
-    def extract_requester_text_from_message(msg: dict) -> Optional[str]:
-        """Extrait le contenu du <td> qui contient le libellé 'Demande effectuée par'.
+    def extract_all_from_message(self, msg: dict) -> Tuple[Optional[str], Optional[str]]:
+        """Extrait (lien de mise à jour, texte 'Demande effectuée par') en une passe sur le HTML.
 
-        On recherche dans les parties HTML en priorité.
+        Les deux regex octets suffisent pour le gabarit Netflix; sinon on retombe sur les
+        fallbacks (BeautifulSoup, texte brut) avec les parties déjà décodées de cette passe.
         """
         payload = msg.get('payload', {})
-        # Réutiliser le collecteur sans attachements (texte suffira la plupart du temps)
-        # mais on peut appeler _gather_parts si besoin du message id
         message_id = msg.get('id')
-        # Note: utiliser la méthode d'instance pour récupérer les parties si nécessaire
-        parts: List[Tuple[str, bytes]] = []
-        if hasattr(GmailWatcher, "_gather_parts"):
-            # type: ignore[attr-defined]
-            gw = GmailWatcher()
-            parts = gw._gather_parts(payload, message_id)  # type: ignore
-        else:
-            parts = []
-
+        link: Optional[str] = None
+        requester: Optional[str] = None
+        requester_html: List[bytes] = []
+        # Conservés pour les fallbacks du lien, sans reparcourir le payload
         html_candidates: List[str] = []
-        for mime, content in parts:
-            try:
-                text = content.decode('utf-8', errors='ignore')
-            except Exception:
+        text_providers: List[Callable[[], bytes]] = []
+        for mime, get_content in self._iter_parts(payload, message_id, wanted_mimes=('text/html', 'text/plain')):
+            if mime.startswith('text/plain'):
+                text_providers.append(get_content)
                 continue
-            if mime.startswith('text/html'):
-                html_candidates.append(text)
+            content = get_content()
+            if link is None and LINK_SUBSTRINGS:
+                m = _HREF_RE.search(content)
+                if m:
+                    link = html_lib.unescape(m.group(1).decode('utf-8', 'ignore'))
+                    logging.info("Lien contenant motif %s trouvé dans HTML (regex): %s", LINK_SUBSTRINGS, link)
+                elif any(substr in content.lower() for substr in _LINK_SUBSTRINGS_B):
+                    html_candidates.append(content.decode('utf-8', errors='ignore'))
+            if requester is None:
+                m = _REQUESTER_RE.search(content)
+                if m:
+                    txt = _WS_RE.sub(" ", html_lib.unescape(m.group(1).decode('utf-8', 'ignore'))).strip()
+                    if txt:
+                        requester = txt
+                        logging.info("Texte 'Demande effectuée par' trouvé: %s", txt)
+                elif _REQUESTER_MARKER_B in content.lower():
+                    # Libellé présent mais cellule non triviale (balises imbriquées)
+                    requester_html.append(content)
+            if link is not None and requester is not None:
+                return link, requester
 
-        from bs4 import BeautifulSoup
-        for html in html_candidates:
-            soup = BeautifulSoup(html, 'html5lib')
-            # Rechercher toutes les cellules <td> contenant la phrase
-            for td in soup.find_all('td'):
-                txt = td.get_text(separator=' ', strip=True)
-                if not txt:
-                    continue
-                if 'demande effectuée par' in txt.lower():
-                    logging.info("Texte 'Demande effectuée par' trouvé: %s", txt)
-                    return txt
-        logging.info("Texte 'Demande effectuée par' non trouvé dans le message id=%s", msg.get('id'))
-        return None
+        if requester is None:
+            for content in requester_html:
+                requester = _find_requester_cell(content)
+                if requester:
+                    logging.info("Texte 'Demande effectuée par' trouvé: %s", requester)
+                    break
+            else:
+                logging.info("Texte 'Demande effectuée par' non trouvé dans le message id=%s", message_id)
+        if link is None:
+            link = self._find_link_fallback(html_candidates, text_providers, message_id)
+        return link, requester
+
+
+_shared: Optional[GmailWatcher] = None
+
+
+def get_shared_watcher(oauth_port: Optional[int] = None) -> GmailWatcher:
+    """Retourne un GmailWatcher unique pour le processus (identifiants et client Gmail réutilisés).
+
+    oauth_port, si fourni, remplace le port OAuth du watcher partagé (réglage de la GUI).
+    """
+    global _shared
+    if _shared is None:
+        _shared = GmailWatcher(oauth_port=oauth_port)
+    elif oauth_port is not None:
+        _shared.oauth_port = oauth_port
+    return _shared
+
+
+def reset_shared_watcher() -> None:
+    """Oublie le GmailWatcher partagé (ex: après suppression de token.json)."""
+    global _shared
+    _shared = None
@@ -1,21 +1,22 @@
 import argparse
 import os
 import sys
+import threading
 import time
 import logging
 import webbrowser
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 
 try:
     # Contexte package
-    from .gmail_client import GmailWatcher  # type: ignore
+    from .gmail_client import GmailWatcher, _headers, get_shared_watcher  # type: ignore
 except Exception:
     try:
         # PyInstaller avec package 'src' conservé
-        from src.gmail_client import GmailWatcher  # type: ignore
+        from src.gmail_client import GmailWatcher, _headers, get_shared_watcher  # type: ignore
     except Exception:
         # Contexte script/pyinstaller
-        from gmail_client import GmailWatcher  # type: ignore
+        from gmail_client import GmailWatcher, _headers, get_shared_watcher  # type: ignore
 
 # Charger un éventuel .env
 try:
@@ -48,6 +49,16 @@ def open_update_link(link: str, open_once: bool = False, auto_click: bool = Fals
         os.environ["LAST_OPENED_LINK"] = link
 
 
+# Dossiers de sortie déjà créés (évite un makedirs par clic)
+_ENSURED_DIRS: set = set()
+
+
+def _ensure_dir(path: str) -> None:
+    if path not in _ENSURED_DIRS:
+        os.makedirs(path, exist_ok=True)
+        _ENSURED_DIRS.add(path)
+
+
 def _now_ms() -> int:
     return int(time.time() * 1000)
 
@@ -60,29 +71,47 @@ def process_once(
     close_delay: int = 10,
     anchor_ts_ms: Optional[int] = None,
     output_dir: Optional[str] = None,
+    incremental: bool = False,
+    watcher: Optional[GmailWatcher] = None,
+    cancel: Optional[Callable[[], bool]] = None,
 ) -> Tuple[int, bool, Optional[int]]:
-    watcher = GmailWatcher()
-    ids = watcher.search_messages(query=query, max_results=10)
+    # cancel: vérifié entre les étapes (appels Gmail, chaque message); s'il retourne True,
+    # le cycle s'arrête avec le code 3 sans ouvrir de lien
+    if watcher is None:
+        watcher = get_shared_watcher()
+    history_id: Optional[str] = None
+    if incremental:
+        # Mode surveillance: ne relance la recherche que si INBOX a reçu de nouveaux messages.
+        # Le curseur (history_id) n'est enregistré qu'une fois tous les candidats traités.
+        ids, history_id = watcher.search_new_messages(query=query, max_results=10, anchor_ts_ms=anchor_ts_ms)
+    else:
+        ids = watcher.search_messages(query=query, max_results=10, anchor_ts_ms=anchor_ts_ms)
     if not ids:
         logging.info("Aucun message correspondant trouvé.")
+        if history_id:
+            watcher.save_history_id(history_id)
         return 1, False, None
     logging.info("%s message(s) candidat(s) à analyser.", len(ids))
+    if cancel is not None and cancel():
+        logging.info("Cycle interrompu (arrêt demandé).")
+        return 3, False, None
+    # Un seul aller-retour HTTP (BatchHttpRequest) pour tous les candidats
+    messages = watcher.get_messages_raw(ids)
     for mid in ids:
-        msg = watcher.get_message_raw(mid)
-        # Filtrer par date de réception (internalDate en ms depuis epoch)
-        try:
-            internal_ms = int(msg.get('internalDate'))
-        except (TypeError, ValueError):
-            internal_ms = 0
-        logging.info("Analyse message id=%s | internalDate=%s | ancre=%s", mid, internal_ms, anchor_ts_ms)
-        if anchor_ts_ms is not None and internal_ms <= anchor_ts_ms:
-            # Ignorer les messages reçus avant/ancré
-            logging.info("Ignoré (avant l'ancre): id=%s", mid)
+        if cancel is not None and cancel():
+            logging.info("Cycle interrompu (arrêt demandé).")
+            return 3, False, None
+        msg = messages.get(mid)
+        if msg is None:
+            # Absent du lot (erreur déjà journalisée): garder le curseur pour le revoir au prochain cycle
+            history_id = None
             continue
-        link = watcher.extract_update_link_from_message(msg)
+        logging.info("Analyse message id=%s | internalDate=%s | ancre=%s", mid, msg.get('internalDate'), anchor_ts_ms)
+        # Lien et demandeur extraits ensemble: le HTML n'est parcouru qu'une fois
+        link, requester = watcher.extract_all_from_message(msg)
         if debug and not link:
             # Dump minimal sujet/expéditeur pour debug
-            headers = {h['name'].lower(): h['value'] for h in msg.get('payload', {}).get('headers', [])}
+            headers = _headers(msg)
             subject = headers.get('subject', '(sans sujet)')
             sender = headers.get('from', '(inconnu)')
             logging.info("Pas de lien trouvé dans: subject=%s | from=%s | id=%s", subject, sender, mid)
@@ -106,16 +135,22 @@ def process_once(
                 success = True  # Considérer le clic externe comme succès logique d'ouverture
 
             if success:
-                # Extraire texte 'Demande effectuée par' et écrire dans un .txt
+                # Écrire le texte 'Demande effectuée par' (déjà extrait) dans un .txt
                 try:
-                    requester = watcher.extract_requester_text_from_message(msg)
-                    headers = {h['name'].lower(): h['value'] for h in msg.get('payload', {}).get('headers', [])}
+                    headers = _headers(msg)
                     subject = headers.get('subject', '(sans sujet)')
                     ts = _now_ms()
                     out_dir = output_dir or os.getenv('OUTPUT_DIR') or os.path.join(os.getcwd(), 'out')
-                    os.makedirs(out_dir, exist_ok=True)
+                    _ensure_dir(out_dir)
                     out_path = os.path.join(out_dir, f"requester_{ts}.txt")
-                    with open(out_path, 'w', encoding='utf-8') as f:
+                    try:
+                        f = open(out_path, 'w', encoding='utf-8')
+                    except FileNotFoundError:
+                        # Dossier supprimé depuis sa création: le recréer une fois
+                        _ENSURED_DIRS.discard(out_dir)
+                        _ensure_dir(out_dir)
+                        f = open(out_path, 'w', encoding='utf-8')
+                    with f:
                         f.write(f"Subject: {subject}\n")
                         f.write(f"Message-ID: {mid}\n")
                         f.write("--- Demande effectuée par ---\n")
@@ -124,25 +159,29 @@ def process_once(
                 except Exception as e:
                     logging.warning("Impossible d'extraire/écrire le détails demandeur: %s", e)
 
-            # Après un succès de clic: marquer comme lu puis déplacer vers un dossier (libellé) dédié
+            # Après un succès de clic: marquer comme lu et déplacer vers un dossier (libellé) dédié,
+            # en un seul appel modify
             if success:
-                # 1) Marquer comme lu
-                try:
-                    watcher.mark_as_read(mid)
-                except Exception as e:
-                    logging.warning("Impossible de marquer le message comme lu: %s", e)
-                # 2) Déplacer dans le libellé cible
                 try:
                     from .config import TARGET_LABEL
                     target_label = TARGET_LABEL
-                    watcher.move_message_to_label(mid, target_label, remove_from_inbox=True)
+                    watcher.move_message_to_label(mid, target_label, remove_from_inbox=True, mark_read=True)
                 except Exception as e:
                     logging.warning("Impossible de déplacer le message vers le libellé: %s", e)
+                    # Au minimum le marquer comme lu pour ne pas le retraiter au prochain cycle
+                    try:
+                        watcher.mark_as_read(mid)
+                    except Exception as e:
+                        logging.warning("Impossible de marquer le message comme lu: %s", e)
             # Mettre à jour l'ancre au moment courant pour éviter les anciens emails
             new_anchor = _now_ms()
+            if history_id:
+                watcher.save_history_id(history_id)
             logging.info("Traitement terminé pour id=%s, nouvelle ancre=%s", mid, new_anchor)
             return 0, True, new_anchor
     logging.info("Aucun lien '/update-primary-location' trouvé dans les messages récents.")
+    if history_id:
+        watcher.save_history_id(history_id)
     return 2, False, None
 
 
@@ -150,6 +189,8 @@ def watch_loop(interval: int = 60, query: Optional[str] = None, open_once: bool
     logging.info("Surveillance démarrée. Intervalle: %ss | auto_click=%s | close_delay=%ss | output_dir=%s", interval, auto_click, close_delay, output_dir)
     # Ancrage à l'ouverture de l'application: ignorer les anciens emails
     anchor_ts_ms = _now_ms()
+    # Un seul client Gmail pour toute la surveillance (identifiants gardés en mémoire)
+    watcher = get_shared_watcher()
     while True:
         try:
             code, clicked, new_anchor = process_once(
@@ -160,6 +201,8 @@ def watch_loop(interval: int = 60, query: Optional[str] = None, open_once: bool
                 close_delay=close_delay,
                 anchor_ts_ms=anchor_ts_ms,
                 output_dir=output_dir,
+                incremental=True,
+                watcher=watcher,
             )
             if clicked and new_anchor is not None:
                 anchor_ts_ms = new_anchor
@@ -172,6 +215,103 @@ def watch_loop(interval: int = 60, query: Optional[str] = None, open_once: bool
         time.sleep(interval)
 
 
+# Gmail recommande de renouveler users.watch chaque jour (expiration à 7 jours)
+_PUSH_WATCH_RENEW_SECONDS = 24 * 3600
+# Délai minimal entre deux réabonnements Pub/Sub après la fin du flux (erreur de droits, coupure…)
+_PUSH_RESUBSCRIBE_SECONDS = 60
+
+
+def watch_push(topic: str, subscription: str, interval: int = 900, query: Optional[str] = None, open_once: bool = False, debug: bool = False, auto_click: bool = False, close_delay: int = 10, output_dir: Optional[str] = None) -> int:
+    """Surveillance par notifications Gmail (users.watch -> Cloud Pub/Sub) au lieu du polling.
+
+    Chaque message reçu sur l'abonnement réveille la boucle, qui exécute process_once dans ce
+    thread (le client Gmail n'est pas thread-safe). `interval` reste un filet de sécurité.
+    """
+    try:
+        from google.cloud import pubsub_v1  # type: ignore
+    except ModuleNotFoundError as e:
+        raise RuntimeError(
+            "Le module 'google-cloud-pubsub' est introuvable. Activez votre venv puis installez-le:\n"
+            "  .\\.venv\\Scripts\\Activate.ps1\n"
+            "  pip install google-cloud-pubsub\n"
+        ) from e
+
+    logging.info("Surveillance push démarrée. topic=%s | subscription=%s | filet=%ss", topic, subscription, interval)
+    anchor_ts_ms = _now_ms()
+    watcher = get_shared_watcher()
+    wake = threading.Event()
+
+    def on_message(message) -> None:
+        message.ack()
+        wake.set()
+
+    def on_stream_done(future) -> None:
+        # Le flux s'est arrêté (droits, abonnement supprimé, coupure): le signaler et réveiller
+        # la boucle, qui se réabonne au lieu de retomber silencieusement sur le filet `interval`
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            logging.error("Flux Pub/Sub interrompu (%s): %s", subscription, exc)
+            wake.set()
+
+    def subscribe():
+        future = subscriber.subscribe(subscription, callback=on_message)
+        future.add_done_callback(on_stream_done)
+        return future
+
+    subscriber = pubsub_v1.SubscriberClient()
+    streaming = subscribe()
+    renew_at = 0.0
+    resubscribe_at = time.monotonic() + _PUSH_RESUBSCRIBE_SECONDS
+    try:
+        while True:
+            if streaming.done() and time.monotonic() >= resubscribe_at:
+                logging.info("Réabonnement à %s", subscription)
+                streaming = subscribe()
+                resubscribe_at = time.monotonic() + _PUSH_RESUBSCRIBE_SECONDS
+            if time.monotonic() >= renew_at:
+                try:
+                    watcher.start_push_watch(topic)
+                    renew_at = time.monotonic() + _PUSH_WATCH_RENEW_SECONDS
+                except Exception as e:
+                    logging.warning("Renouvellement users.watch échoué, nouvel essai au prochain cycle: %s", e)
+            # Effacer avant le traitement: une notification reçue pendant process_once relancera un cycle
+            wake.clear()
+            try:
+                code, clicked, new_anchor = process_once(
+                    query=query,
+                    open_once=open_once,
+                    debug=debug,
+                    auto_click=auto_click,
+                    close_delay=close_delay,
+                    anchor_ts_ms=anchor_ts_ms,
+                    output_dir=output_dir,
+                    incremental=True,
+                    watcher=watcher,
+                )
+                if clicked and new_anchor is not None:
+                    anchor_ts_ms = new_anchor
+                logging.info("Cycle terminé avec code=%s | clicked=%s | new_anchor=%s", code, clicked, new_anchor)
+            except Exception as e:
+                logging.exception("Erreur dans la boucle: %s", e)
+            timeout = interval
+            if streaming.done():
+                # Flux arrêté: pas de notification à attendre, revenir à l'heure du réabonnement
+                timeout = min(interval, max(1.0, resubscribe_at - time.monotonic()))
+            wake.wait(timeout)
+    except KeyboardInterrupt:
+        logging.info("Arrêt par l'utilisateur.")
+        return 0
+    finally:
+        streaming.cancel()
+        subscriber.close()
+        try:
+            watcher.stop_push_watch()
+        except Exception as e:
+            logging.warning("Impossible de désactiver les notifications Gmail: %s", e)
+
+
 def main(argv=None) -> int:
     parser = argparse.ArgumentParser(description="Ouvre automatiquement le lien Netflix d'update du foyer depuis Gmail.")
     sub = parser.add_subparsers(dest="cmd", required=False)
@@ -194,10 +334,25 @@ def main(argv=None) -> int:
     p_watch.add_argument("--close-delay", type=int, default=10, help="Délai avant fermeture après clic (secondes)")
     p_watch.add_argument("--output-dir", type=str, default=None, help="Dossier où enregistrer les fichiers .txt")
 
+    p_push = sub.add_parser("watch-push", help="Surveille via les notifications Gmail (Cloud Pub/Sub)")
+    p_push.add_argument("--topic", type=str, default=os.getenv("GMAIL_PUBSUB_TOPIC"), help="Topic Pub/Sub (projects/<projet>/topics/<nom>)")
+    p_push.add_argument("--subscription", type=str, default=os.getenv("GMAIL_PUBSUB_SUBSCRIPTION"), help="Abonnement Pub/Sub (projects/<projet>/subscriptions/<nom>)")
+    p_push.add_argument("--interval", type=int, default=900, help="Vérification de secours sans notification (secondes)")
+    p_push.add_argument("--query", type=str, default=None, help="Requête Gmail personnalisée")
+    p_push.add_argument("--open-once", action="store_true", help="N'ouvre pas le même lien deux fois")
+    p_push.add_argument("--debug", action="store_true", help="Affiche des infos de debug si aucun lien trouvé")
+    p_push.add_argument("--auto-click", action="store_true", help="Ouvre la page avec Playwright, clique sur le bouton et ferme")
+    p_push.add_argument("--close-delay", type=int, default=10, help="Délai avant fermeture après clic (secondes)")
+    p_push.add_argument("--output-dir", type=str, default=None, help="Dossier où enregistrer les fichiers .txt")
+
     args = parser.parse_args(argv)
 
     if args.cmd == "watch":
         return watch_loop(interval=args.interval, query=args.query, open_once=args.open_once, debug=args.debug, auto_click=args.auto_click, close_delay=args.close_delay, output_dir=args.output_dir)
+    if args.cmd == "watch-push":
+        if not args.topic or not args.subscription:
+            parser.error("watch-push nécessite --topic et --subscription (ou GMAIL_PUBSUB_TOPIC / GMAIL_PUBSUB_SUBSCRIPTION)")
+        return watch_push(topic=args.topic, subscription=args.subscription, interval=args.interval, query=args.query, open_once=args.open_once, debug=args.debug, auto_click=args.auto_click, close_delay=args.close_delay, output_dir=args.output_dir)
     # default: once
     anchor = args.since_epoch_ms if args.since_epoch_ms is not None else _now_ms()
     code, _clicked, _new_anchor = process_once(query=args.query, open_once=args.open_once, debug=args.debug, auto_click=args.auto_click, close_delay=args.close_delay, anchor_ts_ms=anchor, output_dir=args.output_dir)
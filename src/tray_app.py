@@ -1,55 +1,76 @@
+from __future__ import annotations
+
 import os
-import json
+import base64
+import functools
 import sys
 import threading
 import time
 import logging
+import logging.handlers
 import atexit
-from typing import Optional
-
-import pystray
-from pystray import MenuItem as item
-from PIL import Image, ImageDraw
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-
-# Charger .env si présent
-try:
-    from dotenv import load_dotenv  # type: ignore
-    load_dotenv()
-except Exception:
-    pass
+import queue
+import subprocess
+import zlib
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+# pystray, PIL et tkinter sont importés à la première utilisation: une seconde instance
+# (rejetée par le mutex) ou un démarrage sans fenêtre ne paient pas leur chargement.
+if TYPE_CHECKING:
+    import pystray
+    from pystray import MenuItem as item
+    from PIL import Image
+
+# Charger .env si présent (python-dotenv n'est importé que s'il y a un fichier à lire)
+if os.path.exists(".env"):
+    try:
+        from dotenv import load_dotenv  # type: ignore
+        load_dotenv(".env")
+    except Exception:
+        pass
 
 # --- Single-instance (Windows .exe) -----------------------------------------------------------
 _single_instance_handle = None
 
+# kernel32 chargé et fonctions résolues une seule fois (uniquement pour l'exécutable Windows)
+_k32 = None
+if os.name == "nt" and getattr(sys, "frozen", False):
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        _k32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        _k32.CreateMutexExW.argtypes = [wintypes.LPVOID, wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD]
+        _k32.CreateMutexExW.restype = wintypes.HANDLE
+        _k32.CloseHandle.argtypes = [wintypes.HANDLE]
+        _k32.CloseHandle.restype = wintypes.BOOL
+    except Exception:
+        _k32 = None
+
+_MUTEX_ALL_ACCESS = 0x1F0001
+_ERROR_ALREADY_EXISTS = 183
+
+
 def _enforce_single_instance_if_frozen() -> None:
     """Empêche plusieurs instances lorsque packagé en .exe (Windows).
 
     Crée un mutex nommé Global\\confirm-netflix-house-singleton. Si déjà présent, affiche
     un message et termine le processus immédiatement.
     """
-    if not getattr(sys, "frozen", False):
-        return
-    if os.name != "nt":
+    if _k32 is None:
         return
     try:
         import ctypes
-        from ctypes import wintypes
-
-        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
-        CreateMutexW = kernel32.CreateMutexW
-        CreateMutexW.argtypes = [wintypes.LPVOID, wintypes.BOOL, wintypes.LPCWSTR]
-        CreateMutexW.restype = wintypes.HANDLE
 
         mutex_name = "Global\\confirm-netflix-house-singleton"
-        h_mutex = CreateMutexW(None, False, mutex_name)
+        h_mutex = _k32.CreateMutexExW(None, mutex_name, 0, _MUTEX_ALL_ACCESS)
         if not h_mutex:
             return
         err = ctypes.get_last_error()
         global _single_instance_handle
         _single_instance_handle = h_mutex
-        if err == 183:  # ERROR_ALREADY_EXISTS
+        if err == _ERROR_ALREADY_EXISTS:
             # Optionnel: informer l'utilisateur
             try:
                 user32 = ctypes.WinDLL("user32", use_last_error=True)
@@ -64,94 +85,274 @@ def _enforce_single_instance_if_frozen() -> None:
         pass
 
 def _release_single_instance() -> None:
-    if os.name != "nt":
+    if _k32 is None or not _single_instance_handle:
         return
     try:
-        import ctypes
-        if _single_instance_handle:
-            kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
-            kernel32.CloseHandle(_single_instance_handle)
+        _k32.CloseHandle(_single_instance_handle)
     except Exception:
         pass
 
-# Importer les fonctions de l'app (compatible package et exécutable PyInstaller)
+# Importer les modules de l'app une seule fois, via le package 'src' (python -m src.tray_app
+# depuis la racine, ou exécutable PyInstaller construit avec --hidden-import src.main/src.gmail_client)
+from src import gmail_client as _gmail_client, main as _main  # type: ignore
+process_once = _main.process_once
+
+
+# Icône 64x64 (cercle + barre blanche sur fond bleu) pré-rendue: pixels RGB compressés zlib, encodés base85.
+# Évite de charger ImageDraw et de redessiner l'icône à chaque lancement.
+_ICON_SIZE = (64, 64)
+_ICON_B85 = (
+    "c-rlm!4ZHU3<Nu&W;@mnoH5BsaxAk?ls$$AB<s2t00000<ailFwVMYCkGbX@QUrYZM964tk5IDut_Zb@{v08E)H_"
+    "7@w2*FciGTUQQ2S?m6!WE<AM?@qCuMY>h&DeggMZaO!-t_f0{-~pk3arr`g4D1<v;QMIsN``@cx?q{xzsSOt1eK)"
+    "ZYy1p9b}3gZjTg|HYvH<<Woi=>Gx$0Kg$U-uA}?"
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _make_image() -> Image.Image:
+    # Construite une seule fois par processus (l'icône est constante)
+    from PIL import Image
+    return Image.frombytes("RGB", _ICON_SIZE, zlib.decompress(base64.b85decode(_ICON_B85)))
+
+
+# Chemin de l'interpréteur/exécutable au format Windows (sys.executable ne change pas)
+_EXE = sys.executable.replace("/", "\\") if os.name == "nt" else sys.executable
+
+
+def _startup_command() -> str:
+    """Ligne de commande enregistrée dans HKCU\\...\\Run, quotée selon les règles Windows."""
+    if getattr(sys, "frozen", False):
+        return subprocess.list2cmdline([_EXE])
+    # Démarrer le module explicitement en dev
+    return subprocess.list2cmdline([_EXE, "-m", "src.tray_app"])
+
+
+# Sérialisation de settings.json: orjson si disponible (optionnel), sinon json de la stdlib
 try:
-    # Contexte package (python -m src.tray_app)
-    from .main import process_once, _now_ms  # type: ignore
-except Exception:
+    import orjson  # type: ignore
+
+    def _json_dumps(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+    _json_loads = json.loads
+
+
+# Format des logs: "[YYYY-MM-DD HH:MM:SS] : message" (Formatter partagé par tous les handlers)
+_LOG_FMT = logging.Formatter(fmt="[%(asctime)s] : %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+
+
+# Délai minimal entre deux réveils du watcher déclenchés par l'interface
+_WAKE_DEBOUNCE_SECONDS = 0.1
+
+# Vérification de la présence de l'utilisateur pendant une pause pour inactivité
+_IDLE_RECHECK_SECONDS = 60
+
+
+def _user_idle_seconds() -> Optional[float]:
+    """Secondes écoulées depuis la dernière saisie clavier/souris de la session (Windows).
+
+    Retourne None si l'information n'est pas disponible (autre OS, échec de l'appel).
+    """
+    if os.name != "nt":
+        return None
     try:
-        # PyInstaller avec package 'src' conservé
-        from src.main import process_once, _now_ms  # type: ignore
+        import ctypes
+        from ctypes import wintypes
+
+        class LASTINPUTINFO(ctypes.Structure):
+            _fields_ = [("cbSize", wintypes.UINT), ("dwTime", wintypes.DWORD)]
+
+        info = LASTINPUTINFO()
+        info.cbSize = ctypes.sizeof(LASTINPUTINFO)
+        if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+            return None
+        # Les deux compteurs sont en ms sur 32 bits (rebouclage ~49 jours)
+        now = ctypes.windll.kernel32.GetTickCount() & 0xFFFFFFFF
+        return ((now - info.dwTime) & 0xFFFFFFFF) / 1000.0
     except Exception:
-        # Contexte script/pyinstaller (imports absolus)
-        from main import process_once, _now_ms  # type: ignore
+        return None
+
 
+@dataclass
+class WatcherConfig:
+    """Paramètres du watcher, partagés (par référence) entre TrayApp et WatcherThread."""
 
-def _make_image(color_bg=(30, 144, 255), color_fg=(255, 255, 255)) -> Image.Image:
-    # Génère une icône simple (64x64)
-    img = Image.new('RGB', (64, 64), color_bg)
-    d = ImageDraw.Draw(img)
-    d.ellipse((12, 12, 52, 52), outline=color_fg, width=4)
-    d.rectangle((30, 20, 34, 44), fill=color_fg)
-    return img
+    interval: int = 60
+    # Plafond de l'intervalle quand les cycles successifs ne trouvent rien (backoff)
+    max_interval: int = 300
+    query: Optional[str] = None
+    open_once: bool = True
+    debug: bool = False
+    auto_click: bool = True
+    close_delay: int = 10
+    output_dir: Optional[str] = None
+    # Port du serveur local OAuth transmis au GmailWatcher partagé (None = variable d'environnement)
+    oauth_port: Optional[int] = None
+    # Suspendre les vérifications après N secondes sans activité clavier/souris (Windows); 0 = jamais
+    idle_pause_seconds: int = 0
 
 
 class WatcherThread(threading.Thread):
-    def __init__(
-        self,
-        stop_event: threading.Event,
-        interval: int = 60,
-        query: Optional[str] = None,
-        open_once: bool = True,
-        debug: bool = False,
-        auto_click: bool = True,
-        close_delay: int = 10,
-        output_dir: Optional[str] = None,
-    ) -> None:
+    """Boucle de surveillance; l'attente entre deux cycles se fait sur une Condition.
+
+    stop() et reconfigure() notifient la Condition: l'arrêt est immédiat et une nouvelle
+    configuration est prise en compte sans recréer le thread.
+    """
+
+    def __init__(self, cfg: WatcherConfig) -> None:
         super().__init__(daemon=True)
-        self.stop_event = stop_event
-        self.interval = interval
-        self.query = query
-        self.open_once = open_once
-        self.debug = debug
-        self.auto_click = auto_click
-        self.close_delay = close_delay
-        self.output_dir = output_dir
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._wake_requested = False
+        self.cfg = cfg
+        # Cycles consécutifs sans clic: l'attente double à chaque fois, jusqu'à cfg.max_interval
+        self._empty_streak = 0
+        self._paused_for_idle = False
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def wake(self) -> None:
+        """Interrompt l'attente en cours: un cycle process_once est lancé immédiatement."""
+        with self._cond:
+            self._wake_requested = True
+            self._cond.notify_all()
+
+    def stop_requested(self) -> bool:
+        return self._stopped
+
+    def reconfigure(self, **changes) -> None:
+        """Met à jour la configuration partagée sous verrou; l'échéance d'attente est recalculée."""
+        with self._cond:
+            for name, value in changes.items():
+                setattr(self.cfg, name, value)
+            self._cond.notify_all()
+
+    def _user_away(self, cfg: WatcherConfig) -> bool:
+        """True si la pause pour inactivité est activée et que le seuil est dépassé (log aux transitions)."""
+        if cfg.idle_pause_seconds <= 0:
+            return False
+        idle = _user_idle_seconds()
+        away = idle is not None and idle >= cfg.idle_pause_seconds
+        if away != self._paused_for_idle:
+            self._paused_for_idle = away
+            if away:
+                logging.info("Utilisateur inactif depuis %ss: vérifications suspendues.", int(idle))
+            else:
+                logging.info("Activité détectée: reprise des vérifications.")
+        return away
+
+    def _current_interval(self) -> float:
+        """Intervalle effectif: cfg.interval après une activité, puis doublé à chaque cycle vide."""
+        interval = self.cfg.interval
+        if not self._empty_streak:
+            return interval
+        ceiling = max(self.cfg.max_interval, interval)
+        return min(interval * (2 ** min(self._empty_streak, 5)), ceiling)
+
+    def _wait_next_cycle(self, interval: Optional[float] = None, started: Optional[float] = None) -> bool:
+        """Attend jusqu'à started + intervalle courant (ou un wake()); retourne True si un arrêt a été demandé.
+
+        started est le début du cycle (time.monotonic()): la durée de process_once est ainsi
+        déduite de l'attente et la cadence ne dérive pas.
+        """
+        if started is None:
+            started = time.monotonic()
+        with self._cond:
+            while not self._stopped:
+                if self._wake_requested:
+                    self._wake_requested = False
+                    break
+                # Relu à chaque réveil: un changement d'intervalle déplace l'échéance
+                wait_for = interval if interval is not None else self._current_interval()
+                remaining = started + wait_for - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+            return self._stopped
 
     def run(self) -> None:
-        logging.info("Watcher démarré: interval=%ss auto_click=%s", self.interval, self.auto_click)
-        anchor = _now_ms()
-        while not self.stop_event.is_set():
+        logging.info("Watcher démarré: interval=%ss auto_click=%s", self.cfg.interval, self.cfg.auto_click)
+        anchor = time.time_ns() // 1_000_000
+        while not self._stopped:
+            # Copie cohérente pour le cycle: reconfigure() peut modifier cfg entre-temps.
+            # Un wake() antérieur est couvert par ce cycle.
+            with self._cond:
+                cfg = replace(self.cfg)
+                self._wake_requested = False
+            cycle_start = time.monotonic()
+            if self._user_away(cfg):
+                # Personne devant la session (ou session verrouillée): pas d'appel Gmail
+                if self._wait_next_cycle(_IDLE_RECHECK_SECONDS):
+                    break
+                continue
             try:
                 code, clicked, new_anchor = process_once(
-                    query=self.query,
-                    open_once=self.open_once,
-                    debug=self.debug,
-                    auto_click=self.auto_click,
-                    close_delay=self.close_delay,
+                    query=cfg.query,
+                    open_once=cfg.open_once,
+                    debug=cfg.debug,
+                    auto_click=cfg.auto_click,
+                    close_delay=cfg.close_delay,
                     anchor_ts_ms=anchor,
-                    output_dir=self.output_dir,
+                    output_dir=cfg.output_dir,
+                    incremental=True,
+                    watcher=_gmail_client.get_shared_watcher(oauth_port=cfg.oauth_port),
+                    cancel=self.stop_requested,
                 )
                 if clicked and new_anchor is not None:
                     anchor = new_anchor
+                self._empty_streak = 0 if clicked else self._empty_streak + 1
             except Exception as e:
+                self._empty_streak += 1
                 logging.exception("Erreur watcher: %s", e)
-            # Attente avec sortie anticipée si stop_event
-            if self.stop_event.wait(self.interval):
+            # Attente avec sortie anticipée si stop(); échéance comptée depuis le début du cycle
+            if self._wait_next_cycle(started=cycle_start):
                 break
         logging.info("Watcher arrêté")
 
 
 class TrayApp:
     def __init__(self) -> None:
+        import pystray
+        from pystray import MenuItem as item
         self.icon = pystray.Icon("confirm_netflix_house", _make_image(), "Netflix House Watcher")
-        self.stop_event = threading.Event()
+        # Dossier de l'application et chemin de settings.json: fixes pour toute la durée du processus
+        if getattr(sys, "frozen", False):
+            self._base_dir = os.path.dirname(sys.executable)
+        else:
+            # fallback dev
+            self._base_dir = os.getcwd()
+        self._cfg_path = os.path.join(self._base_dir, "settings.json")
+        # Racine Tk cachée et son thread, démarrés à la demande (voir _ensure_tk)
+        self._tk_root = None
+        # Empêche deux callbacks simultanés de démarrer chacun un thread Tk
+        self._tk_lock = threading.Lock()
         self.worker: Optional[WatcherThread] = None
-        self.interval = int(os.getenv("POLL_INTERVAL", "60"))
-        self.query = os.getenv("GMAIL_QUERY")
-        self.auto_click = True
-        self.close_delay = int(os.getenv("AUTO_CLOSE_DELAY", "10"))
-        self.output_dir: Optional[str] = os.getenv("OUTPUT_DIR")
+        # Sérialise start/stop/quit (callbacks pystray et thread Tk)
+        self._state_lock = threading.Lock()
+        self._last_wake_ts = 0.0
+        # Dernier contenu écrit dans settings.json (voir _save_config)
+        self._last_saved_cfg: Optional[dict] = None
+        self.cfg = WatcherConfig(
+            interval=int(os.getenv("POLL_INTERVAL", "60")),
+            max_interval=int(os.getenv("POLL_MAX_INTERVAL", "300")),
+            query=os.getenv("GMAIL_QUERY"),
+            open_once=True,
+            debug=False,
+            auto_click=True,
+            close_delay=int(os.getenv("AUTO_CLOSE_DELAY", "10")),
+            output_dir=os.getenv("OUTPUT_DIR"),
+            idle_pause_seconds=int(os.getenv("IDLE_PAUSE_SECONDS", "0")),
+        )
         # Logs: activés par défaut, dossier par défaut ./logs
         self.logging_enabled: bool = True
         self.log_dir: str = os.path.join(self._app_base_dir(), "logs")
@@ -159,16 +360,19 @@ class TrayApp:
         self.run_at_startup: bool = False
         # Port OAuth local (par défaut 6969)
         try:
-            self.oauth_port: int = int(os.getenv("OAUTH_LOCAL_SERVER_PORT", "6969"))
+            self.cfg.oauth_port = int(os.getenv("OAUTH_LOCAL_SERVER_PORT", "6969"))
         except ValueError:
-            self.oauth_port = 6969
+            self.cfg.oauth_port = 6969
 
         # Charger une configuration persistée si disponible
         self._load_config()
 
+        # Libellé d'état précalculé: recalculé seulement au démarrage/arrêt ou changement de port
+        self._status = "STOPPED"
+        self._menu_label = self._format_status_label()
         self.icon.menu = pystray.Menu(
-            item(lambda _item: f"Status: {'RUNNING' if self.worker and self.worker.is_alive() else 'STOPPED'} | OAuth Port: {self.oauth_port}", None, enabled=False),
-            item(lambda _item: f"Config: {self._config_path()}", None, enabled=False),
+            item(self._status_text, None, enabled=False),
+            item(f"Config: {self._cfg_path}", None, enabled=False),
             item("Connect", self.connect),
             item("Disconnect", self.disconnect),
             item("Settings", self.open_settings, default=True),
@@ -178,144 +382,168 @@ class TrayApp:
         )
 
         # Setup logging selon configuration
+        self._last_log_cfg: Optional[Tuple[bool, str]] = None
+        self._log_listener: Optional[logging.handlers.QueueListener] = None
+        self._log_queue_handler: Optional[logging.handlers.QueueHandler] = None
         self._setup_logging()
         # Appliquer le démarrage auto si configuré
         self._apply_run_at_startup(self.run_at_startup)
 
     def start(self, icon: Optional[pystray.Icon] = None, item_clicked: Optional[item] = None):
-        if self.worker and self.worker.is_alive():
-            return
-        self.stop_event.clear()
-        # Appliquer le port OAuth choisi dans l'environnement
-        os.environ["OAUTH_LOCAL_SERVER_PORT"] = str(self.oauth_port)
-        self.worker = WatcherThread(
-            stop_event=self.stop_event,
-            interval=self.interval,
-            query=self.query,
-            open_once=True,
-            debug=False,
-            auto_click=self.auto_click,
-            close_delay=self.close_delay,
-            output_dir=self.output_dir,
-        )
-        self.worker.start()
-        logging.info("Start demandé")
-        self.icon.title = "Netflix House Watcher (RUNNING)"
+        with self._state_lock:
+            # Vérifié sous verrou: il n'y a jamais deux watchers (client Gmail et curseur partagés)
+            if self.worker and self.worker.is_alive():
+                if self.worker.stop_requested():
+                    # Ancien watcher encore dans une étape en cours (appel Gmail, Playwright)
+                    logging.info("Start ignoré: le watcher précédent termine son cycle en cours.")
+                    self._notify("info", "Info", "Le watcher précédent termine son cycle en cours. Réessayez dans quelques secondes.")
+                return
+            self.worker = WatcherThread(self.cfg)
+            self.worker.start()
+            logging.info("Start demandé")
+            self._set_status("RUNNING")
 
     def stop(self, icon: Optional[pystray.Icon] = None, item_clicked: Optional[item] = None):
+        with self._state_lock:
+            self._stop_worker()
+
+    def _stop_worker(self) -> None:
+        # Appelant: détient _state_lock
         if not (self.worker and self.worker.is_alive()):
             return
-        self.stop_event.set()
-        self.worker.join(timeout=5)
+        self.worker.stop()
+        # process_once vérifie stop_requested entre ses étapes: l'attente reste courte
+        self.worker.join(timeout=1)
         logging.info("Stop demandé")
-        self.icon.title = "Netflix House Watcher (STOPPED)"
+        self._set_status("STOPPED")
+
+    def _wake_worker(self) -> None:
+        """Réveille le watcher, au plus une fois par _WAKE_DEBOUNCE_SECONDS (rafales de Save/Connect)."""
+        now = time.monotonic()
+        if now - self._last_wake_ts < _WAKE_DEBOUNCE_SECONDS:
+            return
+        worker = self.worker
+        if worker and worker.is_alive():
+            self._last_wake_ts = now
+            worker.wake()
+
+    def _status_text(self, _item) -> str:
+        # Appelé par pystray à chaque affichage du menu: simple lecture du libellé précalculé
+        return self._menu_label
+
+    def _format_status_label(self) -> str:
+        return f"Status: {self._status} | OAuth Port: {self.cfg.oauth_port}"
+
+    def _set_status(self, status: Optional[str] = None) -> None:
+        """Met à jour le libellé d'état du menu (statut et/ou port) et redessine le menu."""
+        if status is not None:
+            self._status = status
+        label = self._format_status_label()
+        if label != self._menu_label:
+            self._menu_label = label
+            self.icon.update_menu()
 
     def connect(self, icon: Optional[pystray.Icon] = None, item_clicked: Optional[item] = None):
         """Force un appel aux APIs qui déclenchera le flux OAuth si nécessaire."""
         try:
-            # Appliquer le port OAuth choisi dans l'environnement
-            os.environ["OAUTH_LOCAL_SERVER_PORT"] = str(self.oauth_port)
-            try:
-                from .gmail_client import GmailWatcher  # type: ignore
-            except Exception:
-                try:
-                    from src.gmail_client import GmailWatcher  # type: ignore
-                except Exception:
-                    from gmail_client import GmailWatcher  # type: ignore
-            gw = GmailWatcher()
+            # Client dédié: le watcher partagé peut être utilisé au même moment par le thread
+            # du watcher, et son transport HTTP n'est pas thread-safe
+            gw = _gmail_client.GmailWatcher(oauth_port=self.cfg.oauth_port)
             # Appel léger: récupérer 0 mail déclenche juste l'auth si besoin
             gw.search_messages(max_results=1)
-            messagebox.showinfo("Connecté", "Connexion/consentement effectué avec succès.")
+            # Le watcher repartira des identifiants (token.json) obtenus ici à son prochain cycle
+            _gmail_client.reset_shared_watcher()
+            # Identifiants prêts: vérifier la boîte tout de suite plutôt qu'à la fin de l'intervalle
+            self._wake_worker()
+            self._notify("info", "Connecté", "Connexion/consentement effectué avec succès.")
         except Exception as e:
             logging.exception("Erreur connect: %s", e)
-            messagebox.showerror("Erreur connexion", str(e))
+            self._notify("error", "Erreur connexion", str(e))
 
     def disconnect(self, icon: Optional[pystray.Icon] = None, item_clicked: Optional[item] = None):
         """Supprime le token local pour forcer un reconsentement au prochain appel."""
         try:
             token_path = os.path.join(os.getcwd(), 'token.json')
-            if os.path.exists(token_path):
+            # Le watcher partagé garde les identifiants en mémoire: l'oublier aussi
+            _gmail_client.reset_shared_watcher()
+            # Le curseur d'historique Gmail est propre au compte: le repartir de zéro
+            history_path = os.path.join(os.getcwd(), 'history_id.txt')
+            try:
+                os.remove(history_path)
+            except FileNotFoundError:
+                pass
+            try:
                 os.remove(token_path)
-                messagebox.showinfo("Déconnecté", "Token supprimé. Le prochain appel redemandera l'autorisation.")
-            else:
-                messagebox.showinfo("Info", "Aucun token à supprimer.")
+                self._notify("info", "Déconnecté", "Token supprimé. Le prochain appel redemandera l'autorisation.")
+            except FileNotFoundError:
+                self._notify("info", "Info", "Aucun token à supprimer.")
         except Exception as e:
             logging.exception("Erreur disconnect: %s", e)
-            messagebox.showerror("Erreur déconnexion", str(e))
+            self._notify("error", "Erreur déconnexion", str(e))
 
     def open_settings(self, icon: Optional[pystray.Icon] = None, item_clicked: Optional[item] = None):
-        """Ouvre une petite fenêtre pour régler intervalle, délai de fermeture et dossier de sortie."""
+        """Ouvre une petite fenêtre pour régler intervalle, délai de fermeture et dossier de sortie.
+
+        La fenêtre est construite dans le thread Tk: le callback pystray retourne immédiatement.
+        """
+        self._tk_call(self._open_settings_window)
+
+    def _open_settings_window(self) -> None:
         if getattr(self, "_settings_open", False):
             return
+        import tkinter as tk
+        from tkinter import ttk, messagebox
         self._settings_open = True
 
         def on_close():
             self._settings_open = False
             win.destroy()
 
-        win = tk.Tk()
+        # Fenêtre secondaire d'une racine Tk cachée et réutilisée: l'interpréteur Tcl n'est initialisé qu'une fois
+        win = tk.Toplevel(self._tk_root)
         win.title("Settings - Netflix House Watcher")
         win.protocol("WM_DELETE_WINDOW", on_close)
 
         frm = ttk.Frame(win, padding=10)
         frm.grid(row=0, column=0, sticky="nsew")
 
-        ttk.Label(frm, text="Interval (s)").grid(row=0, column=0, sticky="w", padx=5, pady=5)
-        interval_var = tk.StringVar(value=str(self.interval))
-        interval_entry = ttk.Entry(frm, textvariable=interval_var, width=10)
-        interval_entry.grid(row=0, column=1, sticky="w", padx=5, pady=5)
-        # Close delay
-        ttk.Label(frm, text="Close Delay (s)").grid(row=1, column=0, sticky="w", padx=5, pady=5)
-        delay_var = tk.StringVar(value=str(self.close_delay))
-        delay_entry = ttk.Entry(frm, textvariable=delay_var, width=10)
-        delay_entry.grid(row=1, column=1, sticky="w", padx=5, pady=5)
-        # Output folder
-        ttk.Label(frm, text="Output Folder").grid(row=2, column=0, sticky="w", padx=5, pady=5)
-        out_var = tk.StringVar(value=str(self.output_dir or ""))
-        out_entry = ttk.Entry(frm, textvariable=out_var, width=40)
-        out_entry.grid(row=2, column=1, sticky="w", padx=5, pady=5)
-
-        def browse_folder():
-            folder = filedialog.askdirectory()
-            if folder:
-                out_var.set(folder)
-
-        ttk.Button(frm, text="Browse...", command=browse_folder).grid(row=2, column=2, sticky="w", padx=5, pady=5)
-
-        # OAuth port
-        ttk.Label(frm, text="OAuth Port").grid(row=3, column=0, sticky="w", padx=5, pady=5)
-        oauth_var = tk.StringVar(value=str(self.oauth_port))
-        oauth_entry = ttk.Entry(frm, textvariable=oauth_var, width=10)
-        oauth_entry.grid(row=3, column=1, sticky="w", padx=5, pady=5)
+        grid_kw = dict(sticky="w", padx=5, pady=5)
 
-        # Logging enable/disable
-        log_enable_var = tk.BooleanVar(value=bool(self.logging_enabled))
-        log_enable_chk = ttk.Checkbutton(frm, text="Enable Logging", variable=log_enable_var)
-        log_enable_chk.grid(row=4, column=0, sticky="w", padx=5, pady=5)
-
-        # Logs folder
-        ttk.Label(frm, text="Logs Folder").grid(row=5, column=0, sticky="w", padx=5, pady=5)
-        log_dir_var = tk.StringVar(value=str(self.log_dir or ""))
-        log_dir_entry = ttk.Entry(frm, textvariable=log_dir_var, width=40)
-        log_dir_entry.grid(row=5, column=1, sticky="w", padx=5, pady=5)
-
-        def browse_log_folder():
+        def browse_into(var):
+            from tkinter import filedialog
             folder = filedialog.askdirectory()
             if folder:
-                log_dir_var.set(folder)
-
-        ttk.Button(frm, text="Browse...", command=browse_log_folder).grid(row=5, column=2, sticky="w", padx=5, pady=5)
-
-        # Run at startup
-        run_startup_var = tk.BooleanVar(value=bool(self.run_at_startup))
-        run_startup_chk = ttk.Checkbutton(frm, text="Run at Windows startup", variable=run_startup_var)
-        run_startup_chk.grid(row=6, column=0, sticky="w", padx=5, pady=5)
+                var.set(folder)
+
+        # (clé, libellé, type, valeur initiale); "dir" = champ large + bouton Browse...
+        rows = [
+            ("interval", "Interval (s)", "entry", str(self.cfg.interval)),
+            ("max_interval", "Max Interval (s)", "entry", str(self.cfg.max_interval)),
+            ("close_delay", "Close Delay (s)", "entry", str(self.cfg.close_delay)),
+            ("output_dir", "Output Folder", "dir", str(self.cfg.output_dir or "")),
+            ("oauth_port", "OAuth Port", "entry", str(self.cfg.oauth_port)),
+            ("logging_enabled", "Enable Logging", "check", bool(self.logging_enabled)),
+            ("log_dir", "Logs Folder", "dir", str(self.log_dir or "")),
+            ("run_at_startup", "Run at Windows startup", "check", bool(self.run_at_startup)),
+        ]
+        fields = {}
+        for row, (key, label, kind, value) in enumerate(rows):
+            if kind == "check":
+                var = tk.BooleanVar(value=value)
+                ttk.Checkbutton(frm, text=label, variable=var).grid(row=row, column=0, **grid_kw)
+            else:
+                var = tk.StringVar(value=value)
+                ttk.Label(frm, text=label).grid(row=row, column=0, **grid_kw)
+                ttk.Entry(frm, textvariable=var, width=40 if kind == "dir" else 10).grid(row=row, column=1, **grid_kw)
+                if kind == "dir":
+                    ttk.Button(frm, text="Browse...", command=lambda v=var: browse_into(v)).grid(row=row, column=2, **grid_kw)
+            fields[key] = var
+        row = len(rows)
 
         # Config path display
-        ttk.Label(frm, text="Config file").grid(row=7, column=0, sticky="w", padx=5, pady=5)
+        ttk.Label(frm, text="Config file").grid(row=row, column=0, **grid_kw)
         cfg_path = self._config_path()
-        cfg_label = ttk.Label(frm, text=cfg_path, wraplength=420)
-        cfg_label.grid(row=7, column=1, sticky="w", padx=5, pady=5)
+        ttk.Label(frm, text=cfg_path, wraplength=420).grid(row=row, column=1, **grid_kw)
 
         def open_config_folder():
             try:
@@ -325,58 +553,58 @@ class TrayApp:
             except Exception as e:
                 logging.warning("Impossible d'ouvrir le dossier de config: %s", e)
 
-        ttk.Button(frm, text="Open folder", command=open_config_folder).grid(row=7, column=2, sticky="w", padx=5, pady=5)
+        ttk.Button(frm, text="Open folder", command=open_config_folder).grid(row=row, column=2, **grid_kw)
 
         def save_and_close():
             try:
                 was_running = bool(self.worker and self.worker.is_alive())
-                new_interval = int(interval_var.get())
-                new_delay = int(delay_var.get())
-                if new_interval <= 0 or new_delay < 0:
+                new_interval = int(fields["interval"].get())
+                new_max_interval = int(fields["max_interval"].get())
+                new_delay = int(fields["close_delay"].get())
+                if new_interval <= 0 or new_max_interval <= 0 or new_delay < 0:
                     raise ValueError("Valeurs invalides")
-                self.interval = new_interval
-                self.close_delay = new_delay
-                new_out = out_var.get().strip()
-                self.output_dir = new_out or None
+                new_out = fields["output_dir"].get().strip() or None
                 # Port OAuth
-                new_port = int(oauth_var.get())
+                new_port = int(fields["oauth_port"].get())
                 if new_port <= 0 or new_port > 65535:
                     raise ValueError("Port invalide")
-                self.oauth_port = new_port
                 # Logging settings
-                self.logging_enabled = bool(log_enable_var.get())
-                new_log_dir = log_dir_var.get().strip()
+                self.logging_enabled = bool(fields["logging_enabled"].get())
+                new_log_dir = fields["log_dir"].get().strip()
                 if not new_log_dir:
                     # si vide, remettre dossier par défaut
                     new_log_dir = os.path.join(self._app_base_dir(), "logs")
                 self.log_dir = new_log_dir
                 # Run at startup
-                new_run_startup = bool(run_startup_var.get())
+                new_run_startup = bool(fields["run_at_startup"].get())
                 if new_run_startup != self.run_at_startup:
                     self.run_at_startup = new_run_startup
                     self._apply_run_at_startup(self.run_at_startup)
-                # Répercuter immédiatement dans l'environnement
-                os.environ["OAUTH_LOCAL_SERVER_PORT"] = str(self.oauth_port)
-                if self.output_dir:
-                    os.environ["OUTPUT_DIR"] = self.output_dir
+                # Mettre à jour la configuration partagée (sous verrou si le watcher tourne)
+                changes = dict(
+                    interval=new_interval,
+                    max_interval=new_max_interval,
+                    close_delay=new_delay,
+                    output_dir=new_out,
+                    oauth_port=new_port,
+                )
+                # Seuls les champs réellement modifiés sont appliqués (aucun réveil si rien ne change)
+                changes = {name: value for name, value in changes.items() if getattr(self.cfg, name) != value}
+                if changes and was_running:
+                    self.worker.reconfigure(**changes)
+                    # Appliquer les nouveaux réglages dès maintenant
+                    self._wake_worker()
                 else:
-                    os.environ.pop("OUTPUT_DIR", None)
+                    for name, value in changes.items():
+                        setattr(self.cfg, name, value)
+                self._set_status()
                 # Sauvegarder la configuration persistée
                 self._save_config()
                 # Reconfigurer le logging maintenant
                 self._setup_logging()
-                # Redémarrer automatiquement le watcher si nécessaire
                 if was_running:
-                    logging.info("Redémarrage du watcher suite au changement de configuration…")
-                    try:
-                        self.stop()
-                        # Petite latence pour laisser le thread se terminer proprement
-                        time.sleep(0.2)
-                        self.start()
-                        message = "Paramètres sauvegardés. Le watcher a été redémarré."
-                    except Exception as e:
-                        logging.exception("Echec du redémarrage du watcher: %s", e)
-                        message = "Paramètres sauvegardés, mais le redémarrage automatique a échoué. Redémarrez manuellement."
+                    logging.info("Nouvelle configuration appliquée au watcher en cours.")
+                    message = "Paramètres sauvegardés et appliqués au watcher."
                 else:
                     message = "Paramètres sauvegardés."
                 messagebox.showinfo("OK", message)
@@ -385,43 +613,86 @@ class TrayApp:
                 messagebox.showerror("Erreur", "Veuillez entrer des nombres valides.")
 
         buttons = ttk.Frame(frm)
-        buttons.grid(row=8, column=0, columnspan=3, pady=10)
+        buttons.grid(row=row + 1, column=0, columnspan=3, pady=10)
         ttk.Button(buttons, text="Save", command=save_and_close).grid(row=0, column=0, padx=5)
         ttk.Button(buttons, text="Cancel", command=on_close).grid(row=0, column=1, padx=5)
-        win.mainloop()
+
+    def _ensure_tk(self):
+        """Démarre au besoin le thread Tk (racine cachée unique + mainloop) et retourne la racine.
+
+        Toutes les opérations Tk (fenêtres, boîtes de message) y sont exécutées via after(),
+        jamais depuis les callbacks pystray.
+        """
+        with self._tk_lock:
+            if self._tk_root is not None:
+                return self._tk_root
+            ready = threading.Event()
+            errors: list = []
+
+            def tk_main():
+                try:
+                    import tkinter as tk
+                    root = tk.Tk()
+                    root.withdraw()
+
+                    def on_loop_started():
+                        # after() n'est utilisable depuis les autres threads qu'une fois mainloop lancée
+                        self._tk_root = root
+                        ready.set()
+
+                    root.after(0, on_loop_started)
+                    root.mainloop()
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    # Ne jamais laisser l'appelant bloqué si Tk n'a pas pu démarrer
+                    ready.set()
+
+            threading.Thread(target=tk_main, name="tk", daemon=True).start()
+            ready.wait()
+            if self._tk_root is None:
+                cause = errors[0] if errors else None
+                raise RuntimeError(f"Impossible de démarrer l'interface Tk: {cause}") from cause
+            return self._tk_root
+
+    def _tk_call(self, func, *args) -> None:
+        self._ensure_tk().after(0, func, *args)
+
+    def _notify(self, kind: str, title: str, message: str) -> None:
+        """Affiche une boîte de message (info/error/warning) depuis le thread Tk, sans bloquer l'appelant."""
+        from tkinter import messagebox
+        self._tk_call(getattr(messagebox, f"show{kind}"), title, message)
 
     # --- Persistence helpers ---
     def _config_path(self) -> str:
-        return os.path.join(self._app_base_dir(), "settings.json")
+        return self._cfg_path
 
     def _app_base_dir(self) -> str:
-        if getattr(sys, "frozen", False):
-            return os.path.dirname(sys.executable)
-        # fallback dev
-        return os.getcwd()
+        return self._base_dir
 
     def _load_config(self) -> None:
         try:
             cfg_path = self._config_path()
             if not os.path.exists(cfg_path):
                 return
-            with open(cfg_path, "r", encoding="utf-8") as f:
-                cfg = json.load(f)
+            with open(cfg_path, "rb") as f:
+                cfg = _json_loads(f.read())
             # Appliquer valeurs si présentes et valides
-            interval = int(cfg.get("interval", self.interval))
+            interval = int(cfg.get("interval", self.cfg.interval))
             if interval > 0:
-                self.interval = interval
-            close_delay = int(cfg.get("close_delay", self.close_delay))
+                self.cfg.interval = interval
+            max_interval = int(cfg.get("max_interval", self.cfg.max_interval))
+            if max_interval > 0:
+                self.cfg.max_interval = max_interval
+            close_delay = int(cfg.get("close_delay", self.cfg.close_delay))
             if close_delay >= 0:
-                self.close_delay = close_delay
+                self.cfg.close_delay = close_delay
             output_dir = cfg.get("output_dir")
             if isinstance(output_dir, str) and output_dir.strip():
-                self.output_dir = output_dir.strip()
-                os.environ["OUTPUT_DIR"] = self.output_dir
-            oauth_port = int(cfg.get("oauth_port", self.oauth_port))
+                self.cfg.output_dir = output_dir.strip()
+            oauth_port = int(cfg.get("oauth_port", self.cfg.oauth_port))
             if 0 < oauth_port <= 65535:
-                self.oauth_port = oauth_port
-                os.environ["OAUTH_LOCAL_SERVER_PORT"] = str(self.oauth_port)
+                self.cfg.oauth_port = oauth_port
             # Logging
             logging_enabled = cfg.get("logging_enabled", self.logging_enabled)
             self.logging_enabled = bool(logging_enabled)
@@ -438,16 +709,26 @@ class TrayApp:
     def _save_config(self) -> None:
         try:
             cfg = {
-                "interval": self.interval,
-                "close_delay": self.close_delay,
-                "output_dir": self.output_dir,
-                "oauth_port": self.oauth_port,
+                "interval": self.cfg.interval,
+                "max_interval": self.cfg.max_interval,
+                "close_delay": self.cfg.close_delay,
+                "output_dir": self.cfg.output_dir,
+                "oauth_port": self.cfg.oauth_port,
                 "logging_enabled": self.logging_enabled,
                 "log_dir": self.log_dir,
                 "run_at_startup": self.run_at_startup,
             }
-            with open(self._config_path(), "w", encoding="utf-8") as f:
-                json.dump(cfg, f, ensure_ascii=False, indent=2)
+            if cfg == self._last_saved_cfg:
+                return
+            # Écriture atomique: un arrêt pendant l'écriture ne laisse jamais un settings.json tronqué
+            cfg_path = self._config_path()
+            tmp_path = cfg_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_json_dumps(cfg))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, cfg_path)
+            self._last_saved_cfg = cfg
         except Exception as e:
             logging.warning("Impossible d'enregistrer settings.json: %s", e)
 
@@ -455,8 +736,16 @@ class TrayApp:
         """Configure les handlers de logging selon les paramètres utilisateur.
         Format requis: "[full date time] : message" -> on utilise [YYYY-MM-DD HH:MM:SS] : message
         """
+        # Paramètres inchangés: garder les handlers actuels (pas de fermeture/réouverture du fichier)
+        log_cfg = (self.logging_enabled, self.log_dir)
+        if log_cfg == self._last_log_cfg:
+            return
+        self._last_log_cfg = log_cfg
+
         root = logging.getLogger()
         root.setLevel(logging.INFO)
+        # Arrêter l'écouteur précédent (vide la file) avant de fermer ses handlers
+        self._stop_log_listener()
         # Nettoyer les handlers existants
         for h in list(root.handlers):
             try:
@@ -467,24 +756,61 @@ class TrayApp:
             root.removeHandler(h)
 
         # Toujours avoir un flux console pour debug local
-        fmt = logging.Formatter(fmt="[%(asctime)s] : %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
         sh = logging.StreamHandler(sys.stdout)
         sh.setLevel(logging.INFO)
-        sh.setFormatter(fmt)
-        root.addHandler(sh)
+        sh.setFormatter(_LOG_FMT)
+        handlers: List[logging.Handler] = [sh]
 
         # Ajouter FileHandler si activé
+        log_file = None
+        log_file_error: Optional[Exception] = None
         if self.logging_enabled:
             try:
                 os.makedirs(self.log_dir, exist_ok=True)
                 log_file = os.path.join(self.log_dir, "app.log.txt")
                 fh = logging.FileHandler(log_file, encoding="utf-8")
                 fh.setLevel(logging.INFO)
-                fh.setFormatter(fmt)
-                root.addHandler(fh)
-                logging.info("Fichier de log: %s", log_file)
+                fh.setFormatter(_LOG_FMT)
+                handlers.append(fh)
             except Exception as e:
-                logging.warning("Impossible d'initialiser le fichier de log: %s", e)
+                log_file = None
+                # Journalisé après l'installation du QueueHandler: root n'a encore aucun handler,
+                # un logging.warning ici déclencherait basicConfig() (handler stderr en double)
+                log_file_error = e
+
+        # Les threads (watcher, callbacks) ne font qu'un put dans la file; l'écriture console/fichier
+        # a lieu dans le thread du QueueListener
+        log_queue: queue.Queue = queue.Queue(-1)
+        self._log_queue_handler = logging.handlers.QueueHandler(log_queue)
+        root.addHandler(self._log_queue_handler)
+        self._log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self._log_listener.start()
+        if log_file_error is not None:
+            logging.warning("Impossible d'initialiser le fichier de log: %s", log_file_error)
+        if log_file:
+            logging.info("Fichier de log: %s", log_file)
+
+    def _stop_log_listener(self) -> None:
+        """Arrête l'écouteur de logs en écrivant les messages encore en file."""
+        # Retirer d'abord le QueueHandler: plus aucun message ne doit être mis dans une file
+        # que personne ne vide (les logs ultérieurs retombent sur le handler par défaut)
+        if self._log_queue_handler is not None:
+            logging.getLogger().removeHandler(self._log_queue_handler)
+            self._log_queue_handler = None
+        listener = self._log_listener
+        if listener is None:
+            return
+        self._log_listener = None
+        try:
+            listener.stop()
+        except Exception:
+            pass
+        for h in listener.handlers:
+            try:
+                h.flush()
+                h.close()
+            except Exception:
+                pass
 
     # --- Windows startup (HKCU Run) -----------------------------------------------------------
     def _apply_run_at_startup(self, enabled: bool) -> None:
@@ -497,17 +823,19 @@ class TrayApp:
             return
         try:
             key_path = r"Software\Microsoft\Windows\CurrentVersion\Run"
-            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, key_path, 0, winreg.KEY_SET_VALUE) as key:
+            access = winreg.KEY_QUERY_VALUE | winreg.KEY_SET_VALUE
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, key_path, 0, access) as key:
                 name = "confirm-netflix-house"
                 if enabled:
-                    if getattr(sys, "frozen", False):
-                        cmd = f'"{sys.executable}"'
-                    else:
-                        py = sys.executable.replace("/", "\\")
-                        # Démarrer le module explicitement en dev
-                        cmd = f'"{py}" -m src.tray_app'
-                    winreg.SetValueEx(key, name, 0, winreg.REG_SZ, cmd)
-                    logging.info("Démarrage automatique activé (%s)", cmd)
+                    cmd = _startup_command()
+                    # Valeur déjà en place (cas courant à chaque lancement): pas de réécriture du registre
+                    try:
+                        current, _ = winreg.QueryValueEx(key, name)
+                    except FileNotFoundError:
+                        current = None
+                    if current != cmd:
+                        winreg.SetValueEx(key, name, 0, winreg.REG_SZ, cmd)
+                        logging.info("Démarrage automatique activé (%s)", cmd)
                 else:
                     try:
                         winreg.DeleteValue(key, name)
@@ -519,9 +847,14 @@ class TrayApp:
 
     def quit(self, icon: Optional[pystray.Icon] = None, item_clicked: Optional[item] = None):
         try:
-            self.stop()
+            with self._state_lock:
+                self._stop_worker()
         finally:
             self.icon.stop()
+            if self._tk_root is not None:
+                # Seul endroit où la racine est détruite (les fenêtres Settings ne détruisent que leur Toplevel)
+                self._tk_root.after(0, self._tk_root.destroy)
+            self._stop_log_listener()
 
     def run(self):
         # Démarrer automatiquement